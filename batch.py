@@ -0,0 +1,193 @@
+import sys
+import os
+import io
+import json
+import time
+import traceback
+import xml.etree.ElementTree as ET
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+
+import interpret
+
+# Batch runner: interprets many test cases in one invocation across a pool of worker processes.
+# The cases come either from a directory in the layout of the IPP tests (name.src, name.in, name.out, name.rc,
+# only the .src is required) or from a JSON manifest, a list of {"name", "source", "input", "output", "rc"} objects.
+# Every case is run inside the worker through interpret.run(), which returns the exit code of EXIT and raises the errors.
+
+
+def read_text(path, default=""):
+    if path is None or not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as file:
+        return file.read()
+
+def collect_directory(directory):
+    cases = []
+    for root, _, files in os.walk(directory):
+        for file_name in sorted(files):
+            if not file_name.endswith(".src"):
+                continue
+            base = os.path.join(root, file_name[:-len(".src")])
+            rc = read_text(base + ".rc", "0").strip()
+            cases.append({
+                "name": os.path.relpath(base, directory),
+                "source": base + ".src",
+                "input": base + ".in" if os.path.exists(base + ".in") else None,
+                "output": read_text(base + ".out"),
+                "rc": int(rc) if rc else 0,
+            })
+    return sorted(cases, key=lambda case: case["name"])
+
+def collect_manifest(manifest):
+    with open(manifest, "r", encoding="utf-8") as file:
+        entries = json.load(file)
+    base = os.path.dirname(os.path.abspath(manifest))
+    cases = []
+    for index, entry in enumerate(entries):
+        # paths in the manifest are relative to the manifest itself
+        source = os.path.join(base, entry["source"])
+        cases.append({
+            "name": entry.get("name", os.path.splitext(entry["source"])[0]),
+            "source": source,
+            "input": os.path.join(base, entry["input"]) if entry.get("input") else None,
+            "output": read_text(os.path.join(base, entry["output"])) if entry.get("output") else "",
+            "rc": entry.get("rc", 0),
+        })
+    return cases
+
+
+# state of a worker process, set up once by init_worker()
+worker_options = {}
+loaded_programs = {}
+
+def init_worker(options):
+    worker_options.update(options)
+
+def load_program(source):
+    # cases sharing a source are loaded once per worker, besides the on-disk cache of --cache-dir
+    program = interpret.Program()
+    if source in loaded_programs:
+        program.load_serialized(loaded_programs[source])
+        return program
+    if worker_options.get("cache_dir"):
+        interpret.ProgramCache(worker_options["cache_dir"]).load_program(program, source)
+    else:
+        program.save_instructions(source)
+    loaded_programs[source] = program.serialize()
+    return program
+
+def run_case(case):
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    saved_stderr = sys.stderr
+    sys.stderr = stderr
+    start = time.perf_counter()
+    try:
+        program = load_program(case["source"])
+        if worker_options.get("optimize"):
+            # the same passes as interpret.py -O
+            interpret.Optimizer(program).optimize()
+            interpret.TypeInference(program).specialize()
+        exit_code = interpret.run(program, stdout=stdout, max_steps=worker_options.get("max_steps"),
+                                  max_seconds=worker_options.get("max_seconds"), input_file=case["input"]).exit_code
+    except interpret.InterpreterError as error:
+        exit_code = error.code
+        stderr.write(error.message)
+    except Exception:
+        exit_code = 99
+        stderr.write(traceback.format_exc())
+    finally:
+        sys.stderr = saved_stderr
+    elapsed = time.perf_counter() - start
+
+    # like in the IPP tests, the output is only compared when the program is expected to end successfully
+    passed = exit_code == case["rc"] and (exit_code != 0 or stdout.getvalue() == case["output"])
+    return {
+        "name": case["name"],
+        "passed": passed,
+        "rc": exit_code,
+        "expected_rc": case["rc"],
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+        "time": elapsed,
+    }
+
+def run_cases(cases, jobs=None, options=None):
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(options or {},)) as executor:
+        return list(executor.map(run_case, cases, chunksize=max(1, len(cases) // (4 * (jobs or os.cpu_count() or 1)))))
+
+def summary(results, elapsed):
+    return {
+        "total": len(results),
+        "passed": sum(result["passed"] for result in results),
+        "failed": sum(not result["passed"] for result in results),
+        "time": elapsed,
+        "cases": results,
+    }
+
+def junit_report(report):
+    suite = ET.Element("testsuite", name="ippcode22", tests=str(report["total"]),
+                       failures=str(report["failed"]), time=f"{report['time']:.6f}")
+    for result in report["cases"]:
+        case = ET.SubElement(suite, "testcase", name=result["name"], classname="ippcode22", time=f"{result['time']:.6f}")
+        if not result["passed"]:
+            message = (f"exit code {result['rc']}, expected {result['expected_rc']}" if result["rc"] != result["expected_rc"]
+                       else "output differs")
+            failure = ET.SubElement(case, "failure", message=message)
+            failure.text = result["stdout"]
+        if result["stderr"]:
+            ET.SubElement(case, "system-err").text = result["stderr"]
+    return ET.tostring(suite, encoding="unicode")
+
+
+def main(argv=None):
+    parser = ArgumentParser(description="Interprets many IPPcode22 programs in one invocation.")
+    parser.add_argument('cases', metavar='<directory or manifest>', help='directory with .src/.in/.out/.rc files or a JSON manifest')
+    parser.add_argument('--jobs', '-j', metavar='<count>', type=int, default=None, help='number of worker processes (CPU count by default)')
+    parser.add_argument('--json', metavar='<file>', help='write the summary with the results of every case as JSON')
+    parser.add_argument('--junit', metavar='<file>', help='write the results as JUnit XML')
+    parser.add_argument('--cache-dir', metavar='<directory>', help='share the loaded programs through the program cache')
+    parser.add_argument('-O', dest='optimize', action='store_true', help='optimize every program like interpret.py -O')
+    parser.add_argument('--max-steps', metavar='<instructions>', type=int, help='end a case with exit code 60 after executing N instructions')
+    parser.add_argument('--max-seconds', metavar='<seconds>', type=float, help='end a case with exit code 61 after running for the given time')
+    args = parser.parse_args(argv)
+    if any(limit is not None and limit <= 0 for limit in (args.max_steps, args.max_seconds)):
+        interpret.error_exit(10, "Limits have to be positive.")
+
+    if os.path.isdir(args.cases):
+        cases = collect_directory(args.cases)
+    else:
+        try:
+            cases = collect_manifest(args.cases)
+        except (OSError, ValueError, KeyError, TypeError):
+            interpret.error_exit(11, "Cases can't be read, expected a directory or a JSON manifest.")
+
+    start = time.perf_counter()
+    results = run_cases(cases, args.jobs, {"cache_dir": args.cache_dir, "optimize": args.optimize,
+                                           "max_steps": args.max_steps, "max_seconds": args.max_seconds})
+    report = summary(results, time.perf_counter() - start)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    if args.junit:
+        with open(args.junit, "w", encoding="utf-8") as file:
+            file.write(junit_report(report))
+    for result in results:
+        if result["passed"]:
+            continue
+        if result["rc"] != result["expected_rc"]:
+            print(f"FAIL {result['name']}: exit code {result['rc']} (expected {result['expected_rc']})")
+        else:
+            print(f"FAIL {result['name']}: output differs")
+    print(f"{report['passed']}/{report['total']} passed in {report['time']:.3f}s")
+    return 0 if report["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    try:
+        exit(main())
+    except interpret.InterpreterError as error:
+        sys.stderr.write(error.message)
+        exit(error.code)
@@ -0,0 +1,269 @@
+import sys
+import os
+import io
+import json
+import time
+import resource
+import subprocess
+import tempfile
+import xml.etree.ElementTree as ET
+from argparse import ArgumentParser
+
+import interpret
+
+# Benchmark suite of generated IPPcode22 workloads. Every workload is measured in its own process (bench.py --measure),
+# so the peak memory of one doesn't hide the others, and the best of --repeat runs is kept. The results can be saved
+# as a baseline and a later run compared against it, the comparison fails when a workload got slower than --threshold.
+
+
+def program_xml(code):
+    # code is a list of (opcode, *arguments), the arguments are written like in IPPcode22 ("GF@x", "int@1", "label@top")
+    root = ET.Element("program", language="IPPcode22")
+    for order, (opcode, *args) in enumerate(code, 1):
+        instruction = ET.SubElement(root, "instruction", order=str(order), opcode=opcode)
+        for number, arg in enumerate(args, 1):
+            type_name, _, value = arg.partition("@")
+            if type_name in ("GF", "LF", "TF"):
+                type_name, value = "var", arg
+            ET.SubElement(instruction, f"arg{number}", type=type_name).text = value
+    return ET.tostring(root, encoding="utf-8", xml_declaration=True)
+
+def loop_workload(scale):
+    # tight integer loop
+    return program_xml([
+        ("DEFVAR", "GF@i"), ("DEFVAR", "GF@c"), ("MOVE", "GF@i", "int@0"),
+        ("LABEL", "label@top"),
+        ("ADD", "GF@i", "GF@i", "int@1"),
+        ("LT", "GF@c", "GF@i", f"int@{50000 * scale}"),
+        ("JUMPIFEQ", "label@top", "GF@c", "bool@true"),
+        ("WRITE", "GF@i"),
+    ]), ""
+
+def recursion_workload(scale):
+    # recursive sum of 200..0, every call with its own frame
+    return program_xml([
+        ("DEFVAR", "GF@k"), ("DEFVAR", "GF@r"), ("MOVE", "GF@k", "int@0"),
+        ("LABEL", "label@again"),
+        ("PUSHS", "int@200"), ("CALL", "label@sum"), ("POPS", "GF@r"),
+        ("ADD", "GF@k", "GF@k", "int@1"),
+        ("JUMPIFNEQ", "label@again", "GF@k", f"int@{10 * scale}"),
+        ("WRITE", "GF@r"),
+        ("EXIT", "int@0"),
+        ("LABEL", "label@sum"),
+        ("CREATEFRAME",), ("PUSHFRAME",),
+        ("DEFVAR", "LF@n"), ("POPS", "LF@n"),
+        ("JUMPIFEQ", "label@base", "LF@n", "int@0"),
+        ("SUB", "LF@n", "LF@n", "int@1"), ("PUSHS", "LF@n"), ("CALL", "label@sum"),
+        ("DEFVAR", "LF@r"), ("POPS", "LF@r"),
+        ("ADD", "LF@n", "LF@n", "int@1"), ("ADD", "LF@r", "LF@r", "LF@n"),
+        ("PUSHS", "LF@r"), ("POPFRAME",), ("RETURN",),
+        ("LABEL", "label@base"),
+        ("PUSHS", "int@0"), ("POPFRAME",), ("RETURN",),
+    ]), ""
+
+def strings_workload(scale):
+    # builds a string with CONCAT, then rewrites every character with GETCHAR and SETCHAR
+    return program_xml([
+        ("DEFVAR", "GF@s"), ("DEFVAR", "GF@i"), ("DEFVAR", "GF@c"), ("DEFVAR", "GF@ch"),
+        ("MOVE", "GF@s", "string@"), ("MOVE", "GF@i", "int@0"),
+        ("LABEL", "label@build"),
+        ("CONCAT", "GF@s", "GF@s", "string@ab"),
+        ("ADD", "GF@i", "GF@i", "int@1"),
+        ("LT", "GF@c", "GF@i", f"int@{2000 * scale}"),
+        ("JUMPIFEQ", "label@build", "GF@c", "bool@true"),
+        ("MOVE", "GF@i", "int@1"),
+        ("LABEL", "label@swap"),
+        ("GETCHAR", "GF@ch", "GF@s", "GF@i"),
+        ("SUB", "GF@i", "GF@i", "int@1"),
+        ("SETCHAR", "GF@s", "GF@i", "GF@ch"),
+        ("ADD", "GF@i", "GF@i", "int@3"),
+        ("LT", "GF@c", "GF@i", f"int@{4000 * scale}"),
+        ("JUMPIFEQ", "label@swap", "GF@c", "bool@true"),
+        ("STRLEN", "GF@i", "GF@s"),
+        ("WRITE", "GF@i"),
+    ]), ""
+
+def read_workload(scale):
+    # sums the input, READ until the end of the input
+    lines = 20000 * scale
+    return program_xml([
+        ("DEFVAR", "GF@x"), ("DEFVAR", "GF@sum"), ("DEFVAR", "GF@t"),
+        ("MOVE", "GF@sum", "int@0"),
+        ("LABEL", "label@next"),
+        ("READ", "GF@x", "type@int"),
+        ("TYPE", "GF@t", "GF@x"),
+        ("JUMPIFEQ", "label@done", "GF@t", "string@nil"),
+        ("ADD", "GF@sum", "GF@sum", "GF@x"),
+        ("JUMP", "label@next"),
+        ("LABEL", "label@done"),
+        ("WRITE", "GF@sum"),
+    ]), "".join(f"{index % 1000}\n" for index in range(lines))
+
+def stack_workload(scale):
+    # arithmetic on the data stack
+    return program_xml([
+        ("DEFVAR", "GF@i"), ("MOVE", "GF@i", "int@0"),
+        ("LABEL", "label@top"),
+        ("PUSHS", "GF@i"), ("PUSHS", "int@1"), ("ADDS",),
+        ("PUSHS", "int@3"), ("MULS",), ("PUSHS", "int@3"), ("IDIVS",),
+        ("POPS", "GF@i"),
+        ("PUSHS", "GF@i"), ("PUSHS", f"int@{30000 * scale}"), ("LTS",),
+        ("PUSHS", "bool@true"), ("JUMPIFEQS", "label@top"),
+        ("WRITE", "GF@i"),
+    ]), ""
+
+WORKLOADS = {
+    "loop": loop_workload,
+    "recursion": recursion_workload,
+    "strings": strings_workload,
+    "read": read_workload,
+    "stack": stack_workload,
+}
+
+
+def execute(program, input_file, stats=None):
+    program.output = interpret.OutputBuffer(io.StringIO())
+    program.fetch_user_input(input_file)
+    try:
+        exit_code = program.execute(stats=stats)
+    finally:
+        program.user_input.close()
+    if exit_code:
+        interpret.error_exit(99, f"The workload ended with exit code {exit_code}.")
+
+def measure(name, scale, optimize=False):
+    source, input_text = WORKLOADS[name](scale)
+    with tempfile.NamedTemporaryFile("w", suffix=".in", delete=False) as input_file:
+        input_file.write(input_text)
+    try:
+        # the executed instructions are counted in a run of their own, the instrumented loop is much slower
+        stats = interpret.Statistics()
+        # loaded like by interpret.py, -O also runs the type inference
+        program = interpret.load(source, optimize)
+        execute(program, input_file.name, stats)
+
+        start = time.perf_counter()
+        program = interpret.load(source, optimize)
+        loaded = time.perf_counter()
+        execute(program, input_file.name)
+        finished = time.perf_counter()
+    finally:
+        os.unlink(input_file.name)
+
+    instructions = sum(stats.counts)
+    return {
+        "instructions": instructions,
+        "load_time": loaded - start,
+        "run_time": finished - loaded,
+        "instructions_per_second": instructions / (finished - loaded),
+        # kilobytes on Linux, the measuring process only runs this one workload
+        "peak_memory_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+def measure_startup(repeat):
+    # wall time of the whole interpreter process on an empty program
+    with tempfile.NamedTemporaryFile("wb", suffix=".xml", delete=False) as source_file:
+        source_file.write(program_xml([]))
+    interpreter = os.path.join(os.path.dirname(os.path.abspath(__file__)), "interpret.py")
+    times = []
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, interpreter, "--source", source_file.name, "--input", os.devnull], check=True)
+            times.append(time.perf_counter() - start)
+    finally:
+        os.unlink(source_file.name)
+    return min(times)
+
+def measure_in_subprocess(name, scale, optimize):
+    command = [sys.executable, os.path.abspath(__file__), "--measure", name, "--scale", str(scale)]
+    if optimize:
+        command.append("-O")
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        interpret.error_exit(99, f"Workload {name} failed: {result.stderr}")
+    return json.loads(result.stdout)
+
+def run_suite(names, scale, repeat, optimize):
+    results = {"startup_time": measure_startup(repeat), "workloads": {}}
+    for name in names:
+        runs = [measure_in_subprocess(name, scale, optimize) for _ in range(repeat)]
+        best = max(runs, key=lambda run: run["instructions_per_second"])
+        best["peak_memory_kb"] = max(run["peak_memory_kb"] for run in runs)
+        results["workloads"][name] = best
+    return results
+
+def compare(results, baseline, threshold):
+    # a workload regresses when its throughput dropped by more than threshold percent, the startup when it grew by more
+    regressions = []
+    limit = threshold / 100
+    if results["startup_time"] > baseline["startup_time"] * (1 + limit):
+        regressions.append(f"startup: {baseline['startup_time']:.3f}s -> {results['startup_time']:.3f}s")
+    for name, result in results["workloads"].items():
+        if name not in baseline["workloads"]:
+            continue
+        before = baseline["workloads"][name]["instructions_per_second"]
+        after = result["instructions_per_second"]
+        if after < before * (1 - limit):
+            regressions.append(f"{name}: {before:,.0f} -> {after:,.0f} instructions/s")
+    return regressions
+
+def print_results(results, baseline=None):
+    print(f"startup {results['startup_time']:.3f}s")
+    print(f"{'workload':<12}{'instructions':>14}{'instr/s':>14}{'change':>9}{'load':>10}{'run':>10}{'peak MB':>10}")
+    for name, result in results["workloads"].items():
+        change = ""
+        if baseline is not None and name in baseline["workloads"]:
+            before = baseline["workloads"][name]["instructions_per_second"]
+            change = f"{(result['instructions_per_second'] / before - 1) * 100:+.1f}%"
+        print(f"{name:<12}{result['instructions']:>14,}{result['instructions_per_second']:>14,.0f}{change:>9}"
+              f"{result['load_time']:>9.3f}s{result['run_time']:>9.3f}s{result['peak_memory_kb'] / 1024:>10.1f}")
+
+
+def main(argv=None):
+    parser = ArgumentParser(description="Benchmarks the interpreter on generated IPPcode22 workloads.")
+    parser.add_argument('workloads', nargs='*', metavar='<workload>', help=f'workloads to run, all by default: {", ".join(WORKLOADS)}')
+    parser.add_argument('--scale', metavar='<factor>', type=int, default=1, help='multiplies the size of every workload')
+    parser.add_argument('--repeat', metavar='<count>', type=int, default=3, help='runs of every workload, the best one is kept')
+    parser.add_argument('-O', dest='optimize', action='store_true', help='optimize the workloads like interpret.py -O')
+    parser.add_argument('--save', metavar='<baseline file>', help='save the results as a baseline')
+    parser.add_argument('--compare', metavar='<baseline file>', help='compare the results with a baseline and fail on regressions')
+    parser.add_argument('--threshold', metavar='<percent>', type=float, default=10.0, help='allowed slowdown against the baseline')
+    parser.add_argument('--measure', metavar='<workload>', help='measure one workload in this process and print the result as JSON')
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.scale, args.optimize)))
+        return 0
+
+    names = args.workloads or list(WORKLOADS)
+    for name in names:
+        if name not in WORKLOADS:
+            interpret.error_exit(10, f"Unknown workload {name}.")
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare, "r") as file:
+                baseline = json.load(file)
+        except (OSError, ValueError):
+            interpret.error_exit(11, "Baseline file can't be read.")
+
+    results = run_suite(names, args.scale, args.repeat, args.optimize)
+    print_results(results, baseline)
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        exit(main())
+    except interpret.InterpreterError as error:
+        sys.stderr.write(error.message)
+        exit(error.code)
@@ -0,0 +1,98 @@
+import sys
+import os
+import socket
+import struct
+
+# Client of server.py with the command line of interpret.py: --source and --input (at least one of them, the other one
+# is read from stdin). The job is sent to the server over its Unix socket and the stdout, stderr and exit code of the
+# program are passed on. When no server is listening, the program is interpreted by interpret.py in this process.
+# Only the standard modules needed for the socket are imported, that's the whole point of the client.
+
+# a request is the lengths of the source and the input followed by both, a response the exit code and the lengths of
+# stdout and stderr followed by both
+REQUEST = struct.Struct("!II")
+RESPONSE = struct.Struct("!iII")
+
+def default_socket_path():
+    return os.environ.get("IPPCODE22_SOCKET") or os.path.join("/tmp", f"ippcode22-{os.getuid()}.sock")
+
+def receive_exactly(connection, size):
+    chunks = []
+    while size:
+        chunk = connection.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("connection closed by the server")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+def read_file(path):
+    if path is None:
+        return sys.stdin.buffer.read()
+    try:
+        with open(path, "rb") as file:
+            return file.read()
+    except OSError:
+        return None
+
+def parse_arguments(argv):
+    options = {"--source": None, "--input": None, "--socket": None}
+    arguments = iter(argv)
+    for argument in arguments:
+        name, equals, value = argument.partition("=")
+        if name not in options:
+            sys.stderr.write(f"Unknown argument: {argument}\n")
+            exit(10)
+        if not equals:
+            value = next(arguments, None)
+            if value is None:
+                sys.stderr.write(f"Missing value of {name}\n")
+                exit(10)
+        options[name] = value
+    return options
+
+def run_locally(options):
+    import runpy
+    sys.argv = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "interpret.py")]
+    for name in ("--source", "--input"):
+        if options[name] is not None:
+            sys.argv += [name, options[name]]
+    runpy.run_path(sys.argv[0], run_name="__main__")
+
+def run_remotely(connection, source, user_input):
+    connection.sendall(REQUEST.pack(len(source), len(user_input)))
+    connection.sendall(source)
+    connection.sendall(user_input)
+    exit_code, stdout_size, stderr_size = RESPONSE.unpack(receive_exactly(connection, RESPONSE.size))
+    sys.stdout.buffer.write(receive_exactly(connection, stdout_size))
+    sys.stdout.flush()
+    sys.stderr.buffer.write(receive_exactly(connection, stderr_size))
+    sys.stderr.flush()
+    return exit_code
+
+
+if __name__ == "__main__":
+    options = parse_arguments(sys.argv[1:])
+    if not (options["--source"] or options["--input"]):
+        sys.stderr.write("Missing at least one of the two arguments: --source, --input")
+        exit(10)
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(options["--socket"] or default_socket_path())
+    except OSError:
+        connection.close()
+        run_locally(options)
+        exit(0)
+
+    # the files are read like interpret.py reads them, a missing one gives the same error codes
+    source = read_file(options["--source"])
+    if source is None:
+        sys.stderr.write("Source file not found.")
+        exit(11)
+    user_input = read_file(options["--input"])
+    if user_input is None:
+        sys.stderr.write("Input file not found.")
+        exit(11)
+    with connection:
+        exit(run_remotely(connection, source, user_input))
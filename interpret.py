@@ -1,52 +1,398 @@
 import xml.etree.ElementTree as ET
 from argparse import ArgumentParser
 import sys
+import os
 import re
+import time
+import signal
+import gc
+import hashlib
+import marshal
+import struct
+import tempfile
+import io
+import mmap
+from bisect import bisect_right
+import operator
+from array import array
+from transpile import compile_program, CompileError
+
+# type tags of the symbols, the values themselves are held as native int, bool and str objects and the NIL singleton
+TYPE_INT = 0
+TYPE_BOOL = 1
+TYPE_STRING = 2
+TYPE_NIL = 3
+TYPE_TYPE = 4
+TYPE_LABEL = 5
+TYPE_VAR = 6
+TYPE_NAMES = ("int", "bool", "string", "nil", "type", "label", "var")
+TYPE_CODES = {name: code for code, name in enumerate(TYPE_NAMES)}
+
+class Nil:
+    def __repr__(self):
+        return "nil"
+
+NIL = Nil()
+
+class Missing:
+    # content of a frame slot that has no value
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+UNDECLARED = Missing("undeclared")        # no DEFVAR for the variable in this frame yet
+UNINITIALISED = Missing("uninitialised")  # declared, but no value assigned yet
+
+class Operand:
+    # value of a type@ or label@ literal for the instructions that check the types of their operands, the literal
+    # holds a str, but it's no string, it can be compared only with a literal of the same type
+    __slots__ = ("type", "name")
+
+    def __init__(self, type, name):
+        self.type = type
+        self.name = name
+
+    def __eq__(self, other):
+        if self.type != other.type:
+            error_exit(53, "Error: wrong operand types.")
+        return self.name == other.name
+
+    def __lt__(self, other):
+        if self.type != other.type:
+            error_exit(53, "Error: wrong operand types.")
+        return self.name < other.name
+
+    def __gt__(self, other):
+        return other < self
+
+    def __repr__(self):
+        return TYPE_NAMES[self.type]
+
+class StringBuffer:
+    # Mutable string a variable holds after SETCHAR, or after CONCAT appending to the variable of its first operand.
+    # The characters are kept in a list, so SETCHAR is O(1) and appending is amortised, and the flat str is built only
+    # when the whole value is read (and kept until the next change). A buffer never leaves its frame slot, every other
+    # instruction gets the flat str from get_var_value(), so two variables never share one.
+    __slots__ = ("chars", "flat")
+
+    def __init__(self, text:str):
+        self.chars = list(text)
+        self.flat = text
+
+    def __len__(self):
+        return len(self.chars)
+
+    def __getitem__(self, index):
+        return self.chars[index]
+
+    def text(self):
+        if self.flat is None:
+            self.flat = "".join(self.chars)
+        return self.flat
+
+    def setchar(self, index, char):
+        self.chars[index] = char
+        self.flat = None
+
+    def extend(self, text:str):
+        self.chars.extend(text)
+        self.flat = None
+
+    def __repr__(self):
+        return repr(self.text())
+
+    def __sizeof__(self):
+        # counted by the --max-memory accounting
+        return object.__sizeof__(self) + sys.getsizeof(self.chars) + (sys.getsizeof(self.flat) if self.flat is not None else 0)
+
+TYPE_OF_VALUE = {int: TYPE_INT, bool: TYPE_BOOL, str: TYPE_STRING, Nil: TYPE_NIL, StringBuffer: TYPE_STRING}
+
+# indexes of the frames in Program.frames
+FRAME_INDEXES = {"GF": 0, "LF": 1, "TF": 2}
+
+ESCAPE_SEQUENCE = re.compile(r"\\(\d{3})")
+
+def decode_escape(match):
+    return chr(int(match.group(1)))
+
+def read_int(line):
+    # an int that can't be converted is read as nil
+    try:
+        return int(line)
+    except ValueError:
+        return NIL
+
+def read_bool(line):
+    return line.lower() == "true"
+
+def type_name_of(value):
+    return TYPE_NAMES[TYPE_OF_VALUE[value.__class__]] if value.__class__ in TYPE_OF_VALUE else str(value)
+
+def value_to_text(type, value):
+    # the only place where the values are converted to their textual form (WRITE)
+    if type == TYPE_STRING:
+        return value
+    if type == TYPE_BOOL:
+        return "true" if value else "false"
+    if type == TYPE_NIL:
+        return ""
+    return str(value)
 
 class Variable:
-    def __init__(self, varname, varframe, vartype=None, varvalue=None):
+    __slots__ = ("varname", "varframe", "frame_index", "slot")
+
+    def __init__(self, varname, varframe):
         self.varname = varname
         self.varframe = varframe
-        self.vartype = vartype
-        self.varvalue = varvalue
+        self.frame_index = FRAME_INDEXES[varframe]
+        self.slot = None    # resolved by Program.resolve_variables()
 
     def __repr__(self):
-        return f"Object {self.varname}=<{self.vartype}|{self.varvalue}> @ {self.varframe}"
+        return f"{self.varframe}@{self.varname}"
 
 class Argument:
+    __slots__ = ("type", "literalValue", "variable")
+
     def __init__(self, type, literalValue=None, variable:Variable=None):
         self.type = type
         self.literalValue = literalValue
         self.variable = variable
 
+    @property
+    def type_name(self):
+        return TYPE_NAMES[self.type]
+
 
 class Instruction:
-    def __init__(self, name):
+    __slots__ = ("name", "order", "args", "handler", "operands")
+
+    def __init__(self, name, order:int=None):
         self.name = name.upper()
+        self.order = order
         self.args = []
+        # bound at load time by Program.bind_instruction()
+        self.handler = None
+        self.operands = ()
 
     def add_argument(self, type, value):
         self.args.append(Argument(type, value))
 
     def add_var_argument(self, name, frame):
-        self.args.append(Argument(type="var", variable=Variable(name, frame)))
+        self.args.append(Argument(type=TYPE_VAR, variable=Variable(name, frame)))
+
+class OutputBuffer:
+    # Collects the output of WRITE and writes it out in bulk once flush_threshold characters are buffered.
+    # The target is either a text stream (stdout by default) or a file descriptor (--output).
+    def __init__(self, target, flush_threshold:int=1 << 16):
+        self.target = target
+        self.flush_threshold = flush_threshold
+        self.chunks = []
+        self.size = 0
+        self.written = 0    # bytes written into a file descriptor target, saved by checkpoints
+
+    def write(self, text:str):
+        self.chunks.append(text)
+        self.size += len(text)
+        if self.size >= self.flush_threshold:
+            self.flush()
+
+    def flush(self):
+        if not self.chunks:
+            return
+        text = "".join(self.chunks)
+        self.chunks.clear()
+        self.size = 0
+        if isinstance(self.target, int):
+            data = memoryview(text.encode("utf-8"))
+            self.written += len(data)
+            while data:
+                data = data[os.write(self.target, data):]
+        else:
+            self.target.write(text)
+            self.target.flush()
+
+    def close(self):
+        self.flush()
+        if isinstance(self.target, int):
+            os.close(self.target)
+
+class InputReader:
+    # Serves the input lines to READ. An input file is memory-mapped and stdin read in large chunks, every chunk is
+    # decoded and split into lines at once and READ takes them through a cursor. Lines from a terminal are read one by
+    # one with input(), so the user is asked only for the lines that are really read. None is returned at the end.
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, source, interactive:bool=False):
+        self.source = source
+        self.interactive = interactive
+        # a pipe gives whatever is available instead of waiting for a whole chunk
+        self.read_chunk = source.read1 if hasattr(source, "read1") else source.read
+        self.lines = []
+        self.cursor = 0
+        self.lines_before = 0   # lines in the chunks before the current one
+        self.pending = b""      # an unfinished line at the end of the last chunk
+
+    @classmethod
+    def open_file(cls, path):
+        file = open(path, "rb")
+        try:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            return cls(file)    # an empty file or a pipe can't be mapped, it's read in chunks like stdin
+        file.close()
+        return cls(buffer)
+
+    def readline(self):
+        if self.cursor == len(self.lines):
+            if self.interactive:
+                try:
+                    line = input()
+                except EOFError:
+                    return None
+                self.lines_before += 1
+                return line
+            if not self.fill():
+                return None
+        line = self.lines[self.cursor]
+        self.cursor += 1
+        return line
+
+    def fill(self):
+        while True:
+            chunk = self.read_chunk(self.CHUNK_SIZE)
+            if not chunk:
+                if not self.pending:
+                    return False
+                data, self.pending = self.pending, b""
+                break
+            data = self.pending + chunk
+            end = data.rfind(b"\n") + 1
+            if end == 0:
+                self.pending = data
+                continue
+            data, self.pending = data[:end], data[end:]
+            break
+
+        self.lines_before += len(self.lines)
+        text = data.decode("utf-8")
+        if "\r" in text:
+            # the same newlines as the text mode of open() recognises
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        self.lines = text.split("\n")
+        if text.endswith("\n"):
+            self.lines.pop()
+        self.cursor = 0
+        return True
+
+    def lines_read(self):
+        return self.lines_before + self.cursor
+
+    def skip(self, count):
+        for _ in range(count):
+            if self.readline() is None:
+                return
+
+    def close(self):
+        if self.source is not sys.stdin.buffer:
+            self.source.close()
 
 class Program:
+    # opcode: (handler method name, operand kinds, *extra operands)
+    # operand kinds: "v" passes the Variable of a var argument, "a" passes the whole Argument,
+    # "l" passes the index of the label, resolved while loading
+    DISPATCH_TABLE = {
+        "MOVE":        ("instruction_move", "va"),
+        "CREATEFRAME": ("instruction_createframe", ""),
+        "PUSHFRAME":   ("instruction_pushframe", ""),
+        "POPFRAME":    ("instruction_popframe", ""),
+        "DEFVAR":      ("instruction_defvar", "v"),
+        "CALL":        ("instruction_call", "l"),
+        "RETURN":      ("instruction_return", ""),
+        "PUSHS":       ("instruction_pushs", "a"),
+        "POPS":        ("instruction_pops", "v"),
+        "ADD":         ("instruction_arithmetic", "vaa", "ADD"),
+        "SUB":         ("instruction_arithmetic", "vaa", "SUB"),
+        "MUL":         ("instruction_arithmetic", "vaa", "MUL"),
+        "IDIV":        ("instruction_arithmetic", "vaa", "IDIV"),
+        "LT":          ("instruction_compare", "vaa", "LT"),
+        "GT":          ("instruction_compare", "vaa", "GT"),
+        "EQ":          ("instruction_compare", "vaa", "EQ"),
+        "AND":         ("instruction_andor", "vaa", "AND"),
+        "OR":          ("instruction_andor", "vaa", "OR"),
+        "NOT":         ("instruction_not", "va"),
+        "INT2CHAR":    ("instruction_int2char", "va"),
+        "STRI2INT":    ("instruction_stri2int", "vaa"),
+        "READ":        ("instruction_read", "va"),
+        "WRITE":       ("instruction_write", "a"),
+        "CONCAT":      ("instruction_concat", "vaa"),
+        "STRLEN":      ("instruction_strlen", "va"),
+        "GETCHAR":     ("instruction_getchar", "vaa"),
+        "SETCHAR":     ("instruction_setchar", "vaa"),
+        "TYPE":        ("instruction_type", "va"),
+        "LABEL":       ("instruction_nop", "a"),
+        "JUMP":        ("instruction_jump", "l"),
+        "JUMPIFEQ":    ("instruction_jumpifeq", "laa"),
+        "JUMPIFNEQ":   ("instruction_jumpifneq", "laa"),
+        "EXIT":        ("instruction_exit", "a"),
+        "DPRINT":      ("instruction_nop", "a"),
+        "BREAK":       ("instruction_nop", ""),
+        # STACK extension
+        "CLEARS":      ("instruction_clears", ""),
+        "ADDS":        ("instruction_stack_arithmetic", "", "ADD"),
+        "SUBS":        ("instruction_stack_arithmetic", "", "SUB"),
+        "MULS":        ("instruction_stack_arithmetic", "", "MUL"),
+        "IDIVS":       ("instruction_stack_arithmetic", "", "IDIV"),
+        "LTS":         ("instruction_stack_compare", "", "LT"),
+        "GTS":         ("instruction_stack_compare", "", "GT"),
+        "EQS":         ("instruction_stack_compare", "", "EQ"),
+        "ANDS":        ("instruction_stack_andor", "", "AND"),
+        "ORS":         ("instruction_stack_andor", "", "OR"),
+        "NOTS":        ("instruction_stack_not", ""),
+        "INT2CHARS":   ("instruction_stack_int2char", ""),
+        "STRI2INTS":   ("instruction_stack_stri2int", ""),
+        "JUMPIFEQS":   ("instruction_jumpifeqs", "l"),
+        "JUMPIFNEQS":  ("instruction_jumpifneqs", "l"),
+    }
+
     def __init__(self):
         self.program_labels = {}
         self.program_instructions = []
         self.instruction_counter = 0
-        self.globalFrame = {}   
-        self.temporaryFrame = None
-        self.localFrame = None
+        # GF, LF and TF, every frame is a list with a slot for each variable name that can appear in it,
+        # the slots are assigned by resolve_variables() while loading
+        self.frames = [[], None, None]
         self.frameStack = []
+        self.global_slots = {}
+        self.local_slots = {}   # shared by LF and TF, a temporary frame becomes the local one
+        # local frames that are no longer used, CREATEFRAME takes them before allocating a new one
+        self.frame_pool = []
+        self.empty_frame = []
 
         self.call_stack = []
         self.data_stack = []
 
-        self.input_file_available:bool = False
-        self.user_file_input:str = None
+        self.user_input:InputReader = None
+        self.interactive_input:bool = False
+
+        self.output = OutputBuffer(sys.stdout)
+        # CONCAT of a monitor that has to see the strings made (Limits.concat()), run instead of concat()
+        self.concat_hook = None
+
 
+    def reset(self):
+        # clears the runtime state, so the loaded program can run again (the instructions, labels and slots stay)
+        self.instruction_counter = 0
+        self.frames[:] = [[UNDECLARED] * len(self.global_slots), None, None]
+        self.frameStack = []
+        self.frame_pool = []
+        self.call_stack = []
+        self.data_stack = []
+        self.concat_hook = None
+        self.user_input = None
+        self.interactive_input = False
+        self.output = OutputBuffer(sys.stdout)
 
     def add_label(self, name, line):
         self.program_labels[name]=line
@@ -56,171 +402,272 @@ class Program:
     
     def fetch_user_input(self, user_file_input):
         if user_file_input == None:
-            self.user_file_input = None
+            # the buffered output is flushed before every READ from a terminal, so the user sees it before typing
+            self.interactive_input = sys.stdin.isatty()
+            self.user_input = InputReader(sys.stdin.buffer, self.interactive_input)
             return
         try:
-            self.user_file_input = open(user_file_input, "r")
-        except FileNotFoundError:
-            error_exit(11, "Input file not found.")  
-
-    def search_labels(self, xml):
-        root = xml.getroot()
-        line_counter = 0
-        for child in root:
-            if child.attrib["opcode"].upper() != "LABEL":
-                line_counter += 1
+            self.user_input = InputReader.open_file(user_file_input)
+        except OSError:
+            error_exit(11, "Input file not found.")
+
+    def redirect_output(self, output_file, flush_threshold:int=1 << 16, resume_at:int=None):
+        # a resumed program continues the output it had written at the time of the checkpoint
+        try:
+            if resume_at is None:
+                target = os.open(output_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+            else:
+                target = os.open(output_file, os.O_WRONLY | os.O_CREAT, 0o666)
+                os.ftruncate(target, resume_at)
+                os.lseek(target, resume_at, os.SEEK_SET)
+        except OSError:
+            error_exit(12, "Output file can't be opened.")
+        self.output = OutputBuffer(target, flush_threshold)
+        self.output.written = resume_at or 0
+
+    def search_labels(self):
+        for index, instruction in enumerate(self.program_instructions):
+            if instruction.name != "LABEL":
                 continue
-            for grandchild in child:
-                if grandchild.attrib["type"] == "label" and grandchild.text != "":
-                    if grandchild.text in self.program_labels:
+            for arg in instruction.args:
+                if arg.type == TYPE_LABEL and arg.literalValue:
+                    if arg.literalValue in self.program_labels:
                         error_exit(52, "Source program error: double label definition.")
-                    self.add_label(grandchild.text, line_counter)
-            line_counter += 1
+                    self.add_label(arg.literalValue, index)
 
     @staticmethod
     def decode_escape_sequences(text):
-        if text == None:
-            error_exit(99, "Internal error: can't decode text with type None.")
-        text = str(text)
-        escape = re.findall(r'\d{3}', text)
-        escape = list(dict.fromkeys(escape)) # remove duplicates
-
-        for esc in escape:
-            regex_string = r"\\" + esc
-            if int(esc) == 92:
-                text = re.sub(regex_string, "\\\\", text)
-            else:    
-                text = re.sub(regex_string, chr(int(esc)), text)
-        return text
-
-    def save_instructions(self, xml):
-        root = xml.getroot()
-        for child in root:
-            instruction = Instruction(child.attrib["opcode"].upper())
-            self.add_instruction(instruction)
-            for grandchild in child:
-                if grandchild.attrib["type"] == "var":
-                    if grandchild.text.startswith("GF"):
-                        instruction.add_var_argument(grandchild.text[3:], "GF")
-                    elif grandchild.text.startswith("LF"):
-                        instruction.add_var_argument(grandchild.text[3:], "LF")
-                    elif grandchild.text.startswith("TF"):
-                        instruction.add_var_argument(grandchild.text[3:], "TF")
-                    else:
-                        error_exit(32, "Error: wrong variable definition.") 
-                elif grandchild.attrib["type"] == "string" and grandchild.text == None:
-                    instruction.add_argument(grandchild.attrib["type"], "") 
-                else:   
-                    instruction.add_argument(grandchild.attrib["type"], grandchild.text)
-
-    def print_stack(self):
-        print()
-        print("GF            | ", self.globalFrame)
-        print("TF            | ", self.temporaryFrame)
-        print("LF            | ", self.localFrame)
-        print("frameStack:   | ", self.frameStack)
-        print("dataStack:    | ", self.data_stack)
+        # string literals are decoded once while loading, the input strings once when they are read
+        if "\\" not in text:
+            return text
+        return ESCAPE_SEQUENCE.sub(decode_escape, text)
+
+    def save_instructions(self, source):
+        # The source is streamed with iterparse, each <instruction> element is turned into an Instruction and cleared
+        # right away, so the XML tree is never held in memory as a whole. Errors in the structure are only reported
+        # once the whole document is read, a malformed document is therefore still reported as 31 first.
+        orders = array("q")
+        structure_error = None
+        root = None
+        depth = 0
+        try:
+            for event, element in ET.iterparse(source, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if depth == 1:
+                        root = element
+                        structure_error = check_program_element(root)
+                    continue
+
+                depth -= 1
+                if depth != 1:
+                    continue
+                if structure_error is None:
+                    try:
+                        order, instruction = parse_instruction_element(element)
+                        orders.append(order)
+                        self.add_instruction(instruction)
+                    except XMLStructureError as error:
+                        structure_error = str(error)
+                    except OverflowError:
+                        structure_error = "Error: incorrect order value of the instruction."
+                root.clear()
+        except FileNotFoundError:
+            error_exit(11, "Source file not found.")
+        except ET.ParseError:
+            error_exit(31, "Error: source XML isn't properly formed.")
+        if structure_error is not None:
+            error_exit(32, structure_error)
+
+        self.sort_instructions(orders)
+        self.search_labels()
+        self.resolve_variables()
+        for instruction in self.program_instructions:
+            self.bind_instruction(instruction)
+
+    def resolve_variables(self):
+        # gives every variable name a slot in its kind of frame, so the variables are accessed by index
+        for instruction in self.program_instructions:
+            for arg in instruction.args:
+                if arg.type != TYPE_VAR:
+                    continue
+                var = arg.variable
+                slots = self.global_slots if var.varframe == "GF" else self.local_slots
+                var.slot = slots.setdefault(var.varname, len(slots))
+        self.frames[0] = [UNDECLARED] * len(self.global_slots)
+        self.empty_frame = [UNDECLARED] * len(self.local_slots)
+
+    def sort_instructions(self, orders):
+        # only a permutation of indexes is sorted, and only when the source isn't in order already
+        if all(orders[i] < orders[i + 1] for i in range(len(orders) - 1)):
+            return
+        permutation = sorted(range(len(orders)), key=orders.__getitem__)
+        for previous, current in zip(permutation, permutation[1:]):
+            if orders[previous] == orders[current]:
+                error_exit(32, "Error: duplicit order.")
+        self.program_instructions = [self.program_instructions[index] for index in permutation]
+
+    def bind_instruction(self, instruction:Instruction):
+        """Resolve the handler of the instruction and unpack its arguments once, so that
+        interpret() doesn't have to compare opcode names on every executed instruction."""
+        if instruction.name not in self.DISPATCH_TABLE:
+            error_exit(32, "Error: Unknown instruction opcode.")
+        handler_name, kinds, *extra = self.DISPATCH_TABLE[instruction.name]
+        if len(instruction.args) != len(kinds):
+            error_exit(32, f"Error: wrong number of arguments of instruction {instruction.name}.")
+
+        operands = []
+        for kind, arg in zip(kinds, instruction.args):
+            if kind == "v":
+                if arg.type != TYPE_VAR:
+                    error_exit(32, f"Error: instruction {instruction.name} expects a variable.")
+                operands.append(arg.variable)
+            elif kind == "l":
+                operands.append(self.label_index(instruction, arg))
+            else:
+                operands.append(arg)
+        instruction.handler = getattr(self, handler_name)
+        instruction.operands = tuple(operands + extra)
+
+    def serialize(self):
+        # compact form of the loaded program for ProgramCache, only built-in types so it can be stored with marshal
+        instructions = []
+        for instruction in self.program_instructions:
+            args = []
+            for arg in instruction.args:
+                if arg.type == TYPE_VAR:
+                    args.append((TYPE_VAR, arg.variable.varframe, arg.variable.varname))
+                elif arg.type == TYPE_NIL:
+                    args.append((TYPE_NIL,))    # NIL has to stay the singleton
+                else:
+                    args.append((arg.type, arg.literalValue))
+            instructions.append((instruction.name, instruction.order, tuple(args)))
+        return (tuple(instructions), self.program_labels, self.global_slots, self.local_slots)
+
+    def load_serialized(self, data):
+        instructions, self.program_labels, self.global_slots, self.local_slots = data
+        for name, order, args in instructions:
+            instruction = Instruction(name, order)
+            for arg in args:
+                if arg[0] == TYPE_VAR:
+                    var = Variable(arg[2], arg[1])
+                    var.slot = (self.global_slots if var.frame_index == 0 else self.local_slots)[var.varname]
+                    instruction.args.append(Argument(TYPE_VAR, variable=var))
+                elif arg[0] == TYPE_NIL:
+                    instruction.args.append(Argument(TYPE_NIL, NIL))
+                else:
+                    instruction.args.append(Argument(*arg))
+            self.bind_instruction(instruction)
+            self.program_instructions.append(instruction)
+        self.frames[0] = [UNDECLARED] * len(self.global_slots)
+        self.empty_frame = [UNDECLARED] * len(self.local_slots)
+
+    def label_index(self, instruction:Instruction, label:Argument):
+        # the labels of all jumps are checked while loading, a program jumping to an undefined label isn't run at all
+        if label.type != TYPE_LABEL:
+            error_exit(32, f"Error: instruction {instruction.name} expects a label.")
+        if label.literalValue not in self.program_labels:
+            error_exit(52, f"Error: jumping to unknown label {label.literalValue}.")
+        return self.program_labels[label.literalValue]
+
+    def print_stack(self, file=sys.stdout):
+        print(file=file)
+        print("GF            | ", self.frame_contents(self.frames[0]), file=file)
+        print("TF            | ", self.frame_contents(self.frames[2]), file=file)
+        print("LF            | ", self.frame_contents(self.frames[1]), file=file)
+        print("frameStack:   | ", [self.frame_contents(frame) for frame in self.frameStack], file=file)
+        print("dataStack:    | ", self.data_stack, file=file)
+        print("callStack:    | ", self.call_stack, file=file)
+
+    def location(self, index):
+        # the instruction at the index with its order and the nearest label before it, for the messages about a position
+        instruction = self.program_instructions[index]
+        starts = [(label_index, label) for label, label_index in self.program_labels.items() if label_index < index]
+        label = max(starts)[1] if starts else "main"
+        return f"instruction {instruction.name} (order {instruction.order}, index {index}) in {label}"
+
+    def frame_contents(self, frame):
+        if frame is None:
+            return None
+        slots = self.global_slots if frame is self.frames[0] else self.local_slots
+        return {name: frame[slot] for name, slot in slots.items() if frame[slot] is not UNDECLARED}
+
+    def get_frame(self, var:Variable):
+        frame = self.frames[var.frame_index]
+        if frame is None:
+            error_exit(55, "Error: cant access frame, frame doesnt exist")
+        return frame
 
     def check_var_exists(self, var:Variable):
         if var == None:
             error_exit(99, "Error: internal error while accessing variable.")
+        return self.get_frame(var)[var.slot] is not UNDECLARED
 
-        if var.varframe == "GF" and not self.globalFrame:
+    def set_var_value(self, var:Variable, value):
+        frame = self.frames[var.frame_index]
+        if frame is None:
             error_exit(55, "Error: cant access frame, frame doesnt exist")
-        if var.varframe == "LF" and not self.localFrame:
+        if frame[var.slot] is UNDECLARED:
+            error_exit(54, "Accessing non-existing variable.")
+        frame[var.slot] = value
+
+    def get_var_value(self, var:Variable):
+        frame = self.frames[var.frame_index]
+        if frame is None:
             error_exit(55, "Error: cant access frame, frame doesnt exist")
-        if var.varframe == "TF" and not self.temporaryFrame:
+        value = frame[var.slot]
+        if value.__class__ is Missing:
+            if value is UNDECLARED:
+                error_exit(54, "error non existing var.")
+            error_exit(56, "Error: Accessing uninitialised variable.")
+        if value.__class__ is StringBuffer:
+            return value.text()
+        return value
+
+    def get_var_content(self, var:Variable):
+        # like get_var_value(), but a StringBuffer is returned as it is, for the string instructions
+        frame = self.frames[var.frame_index]
+        if frame is None:
             error_exit(55, "Error: cant access frame, frame doesnt exist")
+        value = frame[var.slot]
+        if value.__class__ is Missing:
+            if value is UNDECLARED:
+                error_exit(54, "error non existing var.")
+            error_exit(56, "Error: Accessing uninitialised variable.")
+        return value
 
-        if var.varframe == "GF" and self.globalFrame:
-            return var.varname in self.globalFrame.keys()
-        elif var.varframe == "LF" and self.localFrame:
-            return var.varname in self.localFrame.keys()
-        elif var.varframe == "TF" and self.temporaryFrame:
-            return var.varname in self.temporaryFrame.keys()
-        else:
-            return False
-
-    def set_var_value(self, var:Variable, value):
-        if not self.check_var_exists(var):
-            error_exit(54, "Accessing non-existing variable.")
-        if var.varframe == "GF" and self.globalFrame:
-            self.globalFrame[var.varname].varvalue = value
-        elif var.varframe == "LF" and self.localFrame:
-            self.localFrame[var.varname].varvalue = value
-        elif var.varframe == "TF" and self.temporaryFrame:
-            self.temporaryFrame[var.varname].varvalue = value
-        else:
-            error_exit(55, "Error setting the variables value.")
-    
-    def set_var_type(self, var:Variable, type):
-        if not self.check_var_exists(var):
-            error_exit(54, "Accessing non-existing variable.")
-        if var.varframe == "GF" and self.globalFrame:
-            self.globalFrame[var.varname].vartype = type
-        elif var.varframe == "LF" and self.localFrame:
-            self.localFrame[var.varname].vartype = type
-        elif var.varframe == "TF" and self.temporaryFrame:
-            self.temporaryFrame[var.varname].vartype = type
-        else:
-            error_exit(55, "Error setting the variables value.")
+    def get_var_type(self, var:Variable, noError:bool=False):
+        # noError returns None for an uninitialised variable instead of exiting
+        if noError and self.get_frame(var)[var.slot] is UNINITIALISED:
+            return None
+        return TYPE_OF_VALUE[self.get_var_value(var).__class__]
 
-    def get_var_value(self, var:Variable, noError:bool=False):
-        if not self.check_var_exists(var):
-            error_exit(54, "error non existing var.")
-        if var.varframe == "GF" and self.globalFrame:
-            if self.globalFrame[var.varname].varvalue == None and noError:
-                return ""
-            if self.globalFrame[var.varname].varvalue == None:
-                error_exit(56, "Error: Accessing uninitialised variable.") # if the var is uninitalised, throw an error
-            return self.globalFrame[var.varname].varvalue
-        elif var.varframe == "TF" and self.temporaryFrame:
-            if self.temporaryFrame[var.varname].varvalue == None and noError:
-                return ""
-            if self.temporaryFrame[var.varname] == None:
-                error_exit(56, "Error: Accessing uninitialised variable.") 
-            return self.temporaryFrame[var.varname].varvalue
-        elif var.varframe == "LF" and self.localFrame:
-            if self.localFrame[var.varname] == None and noError:
-                return ""
-            if  self.localFrame[var.varname] == None:
-                error_exit(56, "Error: Accessing uninitialised variable.")
-            return self.localFrame[var.varname].varvalue
+    def get_symbol_value(self, symb:Argument):
+        if symb.type == TYPE_VAR:
+            return self.get_var_value(symb.variable)
         else:
-            error_exit(55,"Error while accessing frame")
+            return symb.literalValue
 
-    def get_var_type(self, var:Variable, noError:bool=False):
-        if not self.check_var_exists(var):
-            error_exit(54, "error non existing var.")
-        if var.varframe == "GF" and self.globalFrame:
-            if self.globalFrame[var.varname].vartype == None and noError:  
-                return ""
-            if self.globalFrame[var.varname].vartype == None:
-                error_exit(56, "Error: Accessing uninitialised variable.") # if the var is uninitalised, throw an error
-            return self.globalFrame[var.varname].vartype
-        elif var.varframe == "TF" and self.temporaryFrame:
-            if self.temporaryFrame[var.varname].vartype == None and noError:
-                return ""
-            if self.temporaryFrame[var.varname].vartype == None:
-                error_exit(56, "Error: Accessing uninitialised variable.") 
-            return self.temporaryFrame[var.varname].vartype
-        elif var.varframe == "LF" and self.localFrame:
-            if self.localFrame[var.varname].vartype == None and noError:
-                return ""
-            if  self.localFrame[var.varname].vartype == None:
-                error_exit(56, "Error: Accessing uninitialised variable.")
-            return self.localFrame[var.varname].vartype
+    def get_symbol_content(self, symb:Argument):
+        # like get_operand_value(), but a StringBuffer is returned as it is, for the string instructions
+        if symb.type == TYPE_VAR:
+            return self.get_var_content(symb.variable)
+        elif symb.type == TYPE_TYPE or symb.type == TYPE_LABEL:
+            return Operand(symb.type, symb.literalValue)
         else:
-            error_exit(55,"Error while accessing frame")
+            return symb.literalValue
 
-    def get_symbol_value(self, symb:Argument):
-        if symb.type == "var":
+    def get_operand_value(self, symb:Argument):
+        # value of an operand whose type the instruction checks, a type@ or label@ literal is no string
+        if symb.type == TYPE_VAR:
             return self.get_var_value(symb.variable)
+        elif symb.type == TYPE_TYPE or symb.type == TYPE_LABEL:
+            return Operand(symb.type, symb.literalValue)
         else:
             return symb.literalValue
 
-    def  get_symbol_type(self, symb:Argument):
-        if symb.type == "var":
+    def get_symbol_type(self, symb:Argument):
+        if symb.type == TYPE_VAR:
             return self.get_var_type(symb.variable)
         else:
             return symb.type
@@ -228,312 +675,379 @@ class Program:
 
 
 #######             instructions            #######################################################
-    def instruction_jump(self, label:Argument):
-            target_label = label.literalValue
-            if target_label not in self.program_labels.keys():
-                error_exit(52, "Error: jumping to unknown label.")
-            self.instruction_counter = self.program_labels[target_label]
+    def instruction_jump(self, target:int):
+        self.instruction_counter = target
+
+    def instruction_nop(self, *args):
+        pass
+
+    def instruction_createframe(self):
+        # A frame that was replaced is never referenced again (a frame is either the TF or on the frame stack), so the
+        # replaced TF is cleared and reused, and the TF dropped by POPFRAME waits in the pool. Recursive programs then
+        # allocate frames only up to their deepest recursion, instead of one per call.
+        frame = self.frames[2]
+        if frame is not None:
+            frame[:] = self.empty_frame
+        elif self.frame_pool:
+            self.frames[2] = self.frame_pool.pop()
+        else:
+            self.frames[2] = self.empty_frame[:]
+
+    def instruction_pushframe(self):
+        if self.frames[2] is None:
+            error_exit(55, "Error: undefined Temporary Frame.")
+        self.frames[1] = self.frames[2]
+        self.frameStack.append(self.frames[2])
+        self.frames[2] = None
+
+    def instruction_popframe(self):
+        if not self.frameStack:
+            error_exit(55, "Error: Frame Stack is empty, nothing to pop.")
+        if self.frames[2] is not None:
+            # cleared right away, so the values in it don't stay alive in the pool
+            self.frames[2][:] = self.empty_frame
+            self.frame_pool.append(self.frames[2])
+        self.frames[2] = self.frameStack.pop()
+        # re-set the data in localFrame to reflect top frame at the stack, if the stack is empty, LF is empty too
+        if not self.frameStack:
+            self.frames[1] = None
+        else:
+            self.frames[1] = self.frameStack[-1]
+
+    def instruction_call(self, target:int):
+        self.call_stack.append(self.instruction_counter)
+        self.instruction_counter = target
+
+    def instruction_return(self):
+        if not self.call_stack:
+            error_exit(56, "Error: call stack empty.")
+        self.instruction_counter = self.call_stack.pop()
+
+    def instruction_pushs(self, symb1:Argument):
+        # the stack holds the bare values, their types are known from the values themselves
+        self.data_stack.append(self.get_symbol_value(symb1))
 
     def instruction_defvar(self, var:Variable):
-        if var.varframe == "GF":
-            if self.globalFrame == None:
-                error_exit(55, "Error: specified frame doesn't exist")
-            if var.varname in self.globalFrame:
-                error_exit(52, "Error: variable redefinition.")    
-            self.globalFrame[var.varname] = var
-        elif var.varframe == "TF":
-            if self.temporaryFrame == None:
-                error_exit(55, "Error: specified frame doesn't exist")
-            if var.varname in self.temporaryFrame:
-                error_exit(52, "Error: variable redefinition.")
-            self.temporaryFrame[var.varname] = var
-        elif var.varframe == "LF":
-            if self.localFrame == None:
-                error_exit(55, "Error: specified frame doesn't exist")
-            if var.varname in self.localFrame:
-                error_exit(52, "Error: variable redefinition.")
-            self.localFrame[var.varname] = var
-        else:
-            error_exit(55, "Error: wrong frame name.")
+        frame = self.get_frame(var)
+        if frame[var.slot] is not UNDECLARED:
+            error_exit(52, "Error: variable redefinition.")
+        frame[var.slot] = UNINITIALISED
 
     def instruction_write(self, symb1:Argument):
-        if self.get_symbol_type(symb1) == "nil":
-            print("", end="")
-        elif symb1.type == "var":
-            text = self.get_var_value(symb1.variable)
-            print(self.decode_escape_sequences(text), end="")
-        else:
-            text = symb1.literalValue
-            print(self.decode_escape_sequences(text), end="")
+        symbol_type = self.get_symbol_type(symb1)
+        if symbol_type == TYPE_NIL:
+            return
+        self.output.write(value_to_text(symbol_type, self.get_symbol_value(symb1)))
 
     def instruction_move(self, var:Variable, symb1:Argument):
-        if symb1.type == "var":   # moving data from var to var
-            if var.varframe =="GF":
-                self.globalFrame[var.varname].varvalue = self.get_var_value(symb1.variable)
-                self.globalFrame[var.varname].vartype = self.get_var_type(symb1.variable)
-            elif var.varframe =="TF":
-                self.temporaryFrame[var.varname].varvalue = self.get_var_value(symb1.variable)
-                self.temporaryFrame[var.varname].vartype = self.get_var_type(symb1.variable)
-            elif var.varframe =="LF":
-                self.localFrame[var.varname].varvalue = self.get_var_value(symb1.variable)
-                self.localFrame[var.varname].vartype = self.get_var_type(symb1.variable)
-            
-        else: # moving literal into var
-            if var.varframe =="GF" and self.globalFrame:
-                self.globalFrame[var.varname].varvalue = symb1.literalValue
-                self.globalFrame[var.varname].vartype = symb1.type
-            elif var.varframe =="TF" and self.temporaryFrame:
-                self.temporaryFrame[var.varname].varvalue = symb1.literalValue
-                self.temporaryFrame[var.varname].vartype = symb1.type
-            elif var.varframe =="LF" and self.localFrame:
-                self.localFrame[var.varname].varvalue = symb1.literalValue
-                self.localFrame[var.varname].vartype = symb1.type
-            else:
-                error_exit(55, "Error moving literal to variable.")
+        self.set_var_value(var, self.get_symbol_value(symb1))
 
     def instruction_pops(self, var:Variable):
         if not self.data_stack:
             error_exit(56, "Error: can't pop, stack is empty.")
         if not self.check_var_exists(var):
             error_exit(54, "Error: variable doesn't exist.")
-        data_tuple = self.data_stack.pop()      
-        self.set_var_type(var, data_tuple[0])
-        self.set_var_value(var, data_tuple[1])
+        self.set_var_value(var, self.data_stack.pop())
 
     def instruction_arithmetic(self, var:Variable, symb1:Argument, symb2:Argument, op):
-        op = op.upper()
         if not self.check_var_exists(var):
             error_exit(54, "Erorr: Variable doesn't exist")
-        if self.get_symbol_type(symb1) != "int" or self.get_symbol_type(symb2) != "int":
-            error_exit(53, f"Error:incorrect symbol types: {self.get_symbol_type(symb1)}, {self.get_symbol_type(symb2)}")
-        
-        try:
-            symb1_val = int(self.get_symbol_value(symb1))
-            symb2_val = int(self.get_symbol_value(symb2))
-        except ValueError:
-            error_exit(53, "Error: incorrect symbol type.")
-        if op == "ADD":
-            self.set_var_value(var, str(symb1_val + symb2_val))
-        elif op == "SUB":
-            self.set_var_value(var, str(symb1_val - symb2_val))
-        elif op == "MUL":
-            self.set_var_value(var, str(symb1_val * symb2_val))
-        elif op == "IDIV":
-            if symb2_val == 0:
-                error_exit(57, "Error: zero division error.")
-            self.set_var_value(var, str(symb1_val // symb2_val))
-        else:
-            error_exit(99, f"Error: unknown arith. operator: {op}")
-        self.set_var_type(var, "int")
+        self.set_var_value(var, self.arithmetic(op, self.get_operand_value(symb1), self.get_operand_value(symb2)))
 
     def instruction_compare(self, var, symb1, symb2, op):
-        op = op.upper()
-        if self.get_symbol_type(symb1) != self.get_symbol_type(symb2):
-            if self.get_symbol_type(symb1) != "nil" or self.get_symbol_type(symb2) != "nil":
-                error_exit(53, f"Error: wrong operands in instruction {op}")
-        if op != "EQ" and (self.get_symbol_type(symb1) == "nil" or self.get_symbol_type(symb2) == "nil"):
-            error_exit(53, f"Error: wrong operands in instruction {op}")
-        
-        if self.get_symbol_type(symb1) == "int":
-            symb1_val = int(self.get_symbol_value(symb1))
-            symb2_val = int(self.get_symbol_value(symb2))
-        else:   
-            symb1_val = str(self.get_symbol_value(symb1))
-            symb2_val = str(self.get_symbol_value(symb2))
-          
-        if op == "LT":
-            self.set_var_value(var, str(symb1_val < symb2_val).lower())
-        elif op == "GT":
-            self.set_var_value(var, str(symb1_val > symb2_val).lower())
-        elif op == "EQ":
-            self.set_var_value(var, str(symb1_val == symb2_val).lower())
-        else:
-            error_exit(99, f"Error: unknown operator: {op}")
-        self.set_var_type(var, "bool")
+        self.set_var_value(var, self.compare(op, self.get_operand_value(symb1), self.get_operand_value(symb2)))
 
     def instruction_andor(self, var, symb1, symb2, op):
-        op = op.upper()
-        if not (self.get_symbol_type(symb1) == "bool" and self.get_symbol_type(symb2) == "bool"):
-            error_exit(53, f"Error: instruction {op} takes only bool arguments.")
-        symb1_val = self.get_symbol_value(symb1)
-        symb2_val = self.get_symbol_value(symb2)
-
-        symb1_val = True if symb1_val == "true" else False
-        symb2_val = True if symb2_val == "true" else False
-        
-        
-        self.set_var_type(var, "bool")
-        if op == "AND":
-            self.set_var_value(var, str(symb1_val and symb2_val).lower())
-        elif op == "OR":
-            self.set_var_value(var, str(symb1_val or symb2_val).lower())
-        else:
-            error_exit(99, f"Error: unknown operator: {op}")
+        self.set_var_value(var, self.andor(op, self.get_operand_value(symb1), self.get_operand_value(symb2)))
     
     def instruction_not(self, var, symb1):
-        if self.get_symbol_type(symb1) != "bool":
-            error_exit(53, "Error: instruction NOT requires bool argument.")
-        symb1_val = self.get_symbol_value(symb1)
-        self.set_var_type(var, "bool")
-        if symb1_val == "true":      
-            self.set_var_value(var, 'false')
-        else:
-            self.set_var_value(var, 'true')
-        
+        self.set_var_value(var, self.negate(self.get_operand_value(symb1)))
 
     def instruction_int2char(self, var, symb1):
-        try:
-            symb1_val = int(self.get_symbol_value(symb1))
-        except ValueError:
-            error_exit(53, "Error: incorrect symbol type.")
-        if self.get_symbol_type(symb1) != "int":
-            error_exit(53, "Error: incorrect argument type.")
-        if symb1_val < 0:
-            error_exit(58, "Error: Incorrect INT2CHAR number value.")
-        self.set_var_value(var, chr(symb1_val))
-        self.set_var_type(var, "string")
-
+        self.set_var_value(var, self.int2char(self.get_operand_value(symb1)))
 
     def instruction_concat(self, var, symb1, symb2):
-        if not (self.get_symbol_type(symb1) == self.get_symbol_type(symb2) == "string"):
+        string1 = self.get_symbol_content(symb1)
+        string2 = self.get_operand_value(symb2)
+        if not ((string1.__class__ is str or string1.__class__ is StringBuffer) and string2.__class__ is str):
             error_exit(53, "Error: Wrong argument type.")
-        symb1_val = str(self.get_symbol_value(symb1))
-        symb2_val = str(self.get_symbol_value(symb2))
-        self.set_var_value(var, str(symb1_val + symb2_val))
-        self.set_var_type(var, "string")
+        if self.concat_hook is None:
+            self.concat(var, symb1, string1, string2)
+        else:
+            self.concat_hook(var, symb1, string1, string2)
+
+    def concat(self, var, symb1, string1, string2):
+        # appending to the variable itself (CONCAT LF@s LF@s ...) extends its buffer in place
+        if symb1.type == TYPE_VAR and symb1.variable.slot == var.slot and symb1.variable.frame_index == var.frame_index:
+            if string1.__class__ is str:
+                string1 = StringBuffer(string1)
+                self.set_var_value(var, string1)
+            string1.extend(string2)
+        elif string1.__class__ is str:
+            self.set_var_value(var, string1 + string2)
+        else:
+            self.set_var_value(var, string1.text() + string2)
 
     def instruction_exit(self, symb1):
-        try:
-            symb1_val = int(self.get_symbol_value(symb1))
-        except ValueError:
-            error_exit(53, "Error: incorrect argument type.")
-        if self.get_symbol_type(symb1) != "int":
+        if self.get_symbol_type(symb1) != TYPE_INT:
             error_exit(53, "Error: incorrect argument type.")
+        symb1_val = self.get_symbol_value(symb1)
         if 0 <= symb1_val <= 49:
-            exit(symb1_val)
+            raise ProgramExit(symb1_val)
         else:
             error_exit(57, "Error: incorrect exitcode value.")
 
     def instruction_type(self, var, symb1):
-        if symb1.type == "var":
+        if symb1.type == TYPE_VAR:
             symbol_type = self.get_var_type(symb1.variable, noError=True)
         else:
             symbol_type = symb1.type
-        self.set_var_value(var, symbol_type)
-        self.set_var_type(var, "string")
+        self.set_var_value(var, TYPE_NAMES[symbol_type] if symbol_type is not None else "")
 
     def instruction_stri2int(self, var, symb1, symb2):
-        if not (self.get_symbol_type(symb1) == "string" and self.get_symbol_type(symb2) == "int"):
-            error_exit(53, "Error incorrect argument type.")
-        string = self.get_symbol_value(symb1)
-        pos = int(self.get_symbol_value(symb2))
-
-        if not (0 <= pos <= len(string) - 1):
-            error_exit(58, "Error: indexing error.")
-        if string == "":
-            error_exit(58, "Error: indexing error.")
-
-        char = string[pos]
-        self.set_var_type(var, "int")
-        self.set_var_value(var, ord(char))
+        self.set_var_value(var, self.stri2int(self.get_symbol_content(symb1), self.get_operand_value(symb2)))
 
     def instruction_strlen(self, var, symb1:Argument):
-        if self.get_symbol_type(symb1) != "string":
+        string = self.get_symbol_content(symb1)
+        if string.__class__ is not str and string.__class__ is not StringBuffer:
             error_exit(53, "Error: Instruction STRLEN needs string argument as symb1.")
-        symb1_val = self.get_symbol_value(symb1)
-        length = len(symb1_val)
-        self.set_var_type(var, "int")
-        self.set_var_value(var, length)
+        self.set_var_value(var, len(string))
 
     def instruction_getchar(self, var, symb1:Argument, symb2:Argument):
-        if not (self.get_symbol_type(symb1) == "string" and self.get_symbol_type(symb2) == "int"):
+        string = self.get_symbol_content(symb1)
+        if not ((string.__class__ is str or string.__class__ is StringBuffer) and self.get_symbol_type(symb2) == TYPE_INT):
             error_exit(53, "Error incorrect argument type.") 
-        string = self.get_symbol_value(symb1)
-        pos = int(self.get_symbol_value(symb2))
+        pos = self.get_symbol_value(symb2)
 
         if not (0 <= pos <= len(string) - 1):
             error_exit(58, "Error: indexing error.")
-        if string == "":
-            error_exit(58, "Error: indexing error.")
 
         char = string[pos]
-        self.set_var_type(var, "string")
         self.set_var_value(var, char)
 
     def instruction_setchar(self, var, symb1:Argument, symb2:Argument):
-        if not (self.get_symbol_type(symb1) == "int" and self.get_symbol_type(symb2) == "string"):
+        string = self.get_var_content(var)
+        if not ((string.__class__ is str or string.__class__ is StringBuffer) and self.get_symbol_type(symb1) == TYPE_INT and self.get_symbol_type(symb2) == TYPE_STRING):
             error_exit(53, "Error incorrect argument type.")
 
-        split_string = list(self.get_var_value(var))
-        if len(split_string) == 0:
-            error_exit(58, "Error: indexing error.")
-        new_char = self.get_symbol_value(symb2)[0] #  get the first char in case the string has more characters
-
-        pos = int(self.get_symbol_value(symb1))
-        if not (0 <= pos <= len(split_string) - 1):
+        new_char = self.get_symbol_value(symb2)
+        pos = self.get_symbol_value(symb1)
+        if not (0 <= pos <= len(string) - 1) or new_char == "":
             error_exit(58, "Error: indexing error.")      
 
-        split_string[pos] = new_char
-        self.set_var_value(var, "".join(split_string))
-        self.set_var_type(var, "string")
+        # the string is turned into a buffer on the first SETCHAR and changed in place from then on,
+        # only the first char is used in case the new string has more characters
+        if string.__class__ is str:
+            string = StringBuffer(string)
+            self.set_var_value(var, string)
+        string.setchar(pos, new_char[0])
 
     def instruction_read(self, var:Variable, type:Argument):
-        if self.get_symbol_type(type) != "type":
+        if type.type != TYPE_TYPE:
+            self.get_symbol_type(type)      # a missing variable is reported before the wrong type
             error_exit(53, "Error: wrong operand type.")
-        if(self.user_file_input is not None):
-            line = self.user_file_input.readline().rstrip('\n')
+        if self.interactive_input:
+            self.output.flush()
+        line = self.user_input.readline()
+        # missing input is read as nil
+        self.set_var_value(var, NIL if line is None else INPUT_CONVERSIONS[type.literalValue](line))
+
+    def instruction_jumpifeq(self, target:int, symb1:Argument, symb2:Argument):
+        if self.equal("JUMPIFEQ", self.get_operand_value(symb1), self.get_operand_value(symb2)):
+            self.instruction_counter = target
+    
+    def instruction_jumpifneq(self, target:int, symb1:Argument, symb2:Argument):
+        if not self.equal("JUMPIFNEQ", self.get_operand_value(symb1), self.get_operand_value(symb2)):
+            self.instruction_counter = target
+
+    # superinstruction created by the Optimizer from LT/GT/EQ followed by JUMPIFEQ/JUMPIFNEQ on the result
+    def instruction_compare_jump(self, var, symb1, symb2, op, target, jump_when):
+        result = self.compare(op, self.get_operand_value(symb1), self.get_operand_value(symb2))
+        self.set_var_value(var, result)
+        if result is jump_when:
+            self.instruction_counter = target
+
+
+#######             stack instructions (STACK extension)            ###################################
+# the operands are popped from the data stack (the second operand is on top) and the result is pushed back,
+# the frames aren't touched at all
+    def pop_operands(self):
+        if len(self.data_stack) < 2:
+            error_exit(56, "Error: can't pop, stack is empty.")
+        symb2_val = self.data_stack.pop()
+        return self.data_stack.pop(), symb2_val
 
-        else:
-            line = input()
-        if line.lower() == "true" and type.literalValue == "bool":
-            self.set_var_type(var, "bool")
-            self.set_var_value(var, "true")
-        elif type.literalValue == "bool":
-            self.set_var_type(var, "bool")
-            self.set_var_value(var, "false")
-        # todo treat empty input differently
-        else:
-            self.set_var_type(var, type.literalValue)
-            self.set_var_value(var, line)
+    def pop_operand(self):
+        if not self.data_stack:
+            error_exit(56, "Error: can't pop, stack is empty.")
+        return self.data_stack.pop()
 
-    def instruction_jumpifeq(self, label:Argument, symb1:Argument, symb2:Argument):
-        if self.get_symbol_type(label) != "label":
-            error_exit(53, "Error: incorrect type.")
+    def instruction_clears(self):
+        self.data_stack.clear()
 
-        if self.get_symbol_type(symb1) != self.get_symbol_type(symb2):
-            if not(self.get_symbol_type(symb1) == "nil" or self.get_symbol_type(symb2) == "nil"):
-                error_exit(53, f"Error: wrong operands in instruction JUMPIFEQ.")
-        
-        symb1_val = self.get_symbol_value(symb1)
-        symb2_val = self.get_symbol_value(symb2)
+    def instruction_stack_arithmetic(self, op):
+        symb1_val, symb2_val = self.pop_operands()
+        self.data_stack.append(self.arithmetic(op, symb1_val, symb2_val))
 
-        if symb1_val == symb2_val:
-            self.instruction_jump(label)
-        else:
-            pass
-    
-    def instruction_jumpifneq(self, label:Argument, symb1:Argument, symb2:Argument):
-        if self.get_symbol_type(label) != "label":
-            error_exit(53, "Error: incorrect type.")
+    def instruction_stack_compare(self, op):
+        symb1_val, symb2_val = self.pop_operands()
+        self.data_stack.append(self.compare(op, symb1_val, symb2_val))
+
+    def instruction_stack_andor(self, op):
+        symb1_val, symb2_val = self.pop_operands()
+        self.data_stack.append(self.andor(op, symb1_val, symb2_val))
+
+    def instruction_stack_not(self):
+        self.data_stack.append(self.negate(self.pop_operand()))
+
+    def instruction_stack_int2char(self):
+        self.data_stack.append(self.int2char(self.pop_operand()))
+
+    def instruction_stack_stri2int(self):
+        symb1_val, symb2_val = self.pop_operands()
+        self.data_stack.append(self.stri2int(symb1_val, symb2_val))
 
-        if self.get_symbol_type(symb1) != self.get_symbol_type(symb2):
-            if not(self.get_symbol_type(symb1) == "nil" or self.get_symbol_type(symb2) == "nil"):
-                error_exit(53, f"Error: wrong operands in instruction JUMPIFNEQ.")
+    def instruction_jumpifeqs(self, target:int):
+        symb1_val, symb2_val = self.pop_operands()
+        if self.equal("JUMPIFEQS", symb1_val, symb2_val):
+            self.instruction_counter = target
 
+    def instruction_jumpifneqs(self, target:int):
+        symb1_val, symb2_val = self.pop_operands()
+        if not self.equal("JUMPIFNEQS", symb1_val, symb2_val):
+            self.instruction_counter = target
+
+
+#######             type-specialised instructions (TypeInference)            #############################
+# selected for the instructions whose operand types are proven at load time, the operands are still fetched
+# in the same order as in the checked handlers, so the errors of missing frames, variables and values stay
+# where they were, only the type checks that can't fail are left out
+    def instruction_arithmetic_int(self, var, symb1, symb2, function):
+        if not self.check_var_exists(var):
+            error_exit(54, "Erorr: Variable doesn't exist")
+        self.set_var_value(var, function(self.get_symbol_value(symb1), self.get_symbol_value(symb2)))
+
+    def instruction_idiv_int(self, var, symb1, symb2):
+        if not self.check_var_exists(var):
+            error_exit(54, "Erorr: Variable doesn't exist")
         symb1_val = self.get_symbol_value(symb1)
         symb2_val = self.get_symbol_value(symb2)
+        if symb2_val == 0:
+            error_exit(57, "Error: zero division error.")
+        self.set_var_value(var, symb1_val // symb2_val)
+
+    def instruction_operation_typed(self, var, symb1, symb2, function):
+        # LT, GT, EQ, AND and OR on operands of the right types
+        self.set_var_value(var, function(self.get_symbol_value(symb1), self.get_symbol_value(symb2)))
 
-        if symb1_val != symb2_val:
-            self.instruction_jump(label)
+    def instruction_not_bool(self, var, symb1):
+        self.set_var_value(var, not self.get_symbol_value(symb1))
+
+    def instruction_concat_string(self, var, symb1, symb2):
+        if self.concat_hook is None:
+            self.concat(var, symb1, self.get_symbol_content(symb1), self.get_symbol_value(symb2))
         else:
-            pass
+            self.concat_hook(var, symb1, self.get_symbol_content(symb1), self.get_symbol_value(symb2))
+
+    def instruction_strlen_string(self, var, symb1):
+        self.set_var_value(var, len(self.get_symbol_content(symb1)))
+
+    def instruction_getchar_typed(self, var, symb1, symb2):
+        string = self.get_symbol_content(symb1)
+        pos = self.get_symbol_value(symb2)
+        if not (0 <= pos <= len(string) - 1):
+            error_exit(58, "Error: indexing error.")
+        self.set_var_value(var, string[pos])
+
+    def instruction_jumpif_typed(self, target, symb1, symb2, jump_when):
+        if (self.get_symbol_value(symb1) == self.get_symbol_value(symb2)) is jump_when:
+            self.instruction_counter = target
+
+    def instruction_compare_jump_typed(self, var, symb1, symb2, function, target, jump_when):
+        result = function(self.get_symbol_value(symb1), self.get_symbol_value(symb2))
+        self.set_var_value(var, result)
+        if result is jump_when:
+            self.instruction_counter = target
+
+
+#######             operations on values shared by the variable and stack instructions            ###########
+    @staticmethod
+    def arithmetic(op, symb1_val, symb2_val):
+        if symb1_val.__class__ is not int or symb2_val.__class__ is not int:
+            error_exit(53, f"Error:incorrect symbol types: {type_name_of(symb1_val)}, {type_name_of(symb2_val)}")
+        if op == "ADD":
+            return symb1_val + symb2_val
+        elif op == "SUB":
+            return symb1_val - symb2_val
+        elif op == "MUL":
+            return symb1_val * symb2_val
+        elif op == "IDIV":
+            if symb2_val == 0:
+                error_exit(57, "Error: zero division error.")
+            return symb1_val // symb2_val
+        error_exit(99, f"Error: unknown arith. operator: {op}")
+
+    @staticmethod
+    def compare(op, symb1_val, symb2_val):
+        if op == "EQ":
+            return Program.equal(op, symb1_val, symb2_val)
+        if symb1_val.__class__ is not symb2_val.__class__ or symb1_val is NIL:
+            error_exit(53, f"Error: wrong operands in instruction {op}")
+        if op == "LT":
+            return symb1_val < symb2_val
+        elif op == "GT":
+            return symb1_val > symb2_val
+        error_exit(99, f"Error: unknown operator: {op}")
+
+    @staticmethod
+    def equal(op, symb1_val, symb2_val):
+        # values of different types can be compared only with nil
+        if symb1_val.__class__ is not symb2_val.__class__:
+            if not (symb1_val is NIL or symb2_val is NIL):
+                error_exit(53, f"Error: wrong operands in instruction {op}.")
+            return False
+        return symb1_val == symb2_val
+
+    @staticmethod
+    def andor(op, symb1_val, symb2_val):
+        if not (symb1_val.__class__ is bool and symb2_val.__class__ is bool):
+            error_exit(53, f"Error: instruction {op} takes only bool arguments.")
+        if op == "AND":
+            return symb1_val and symb2_val
+        elif op == "OR":
+            return symb1_val or symb2_val
+        error_exit(99, f"Error: unknown operator: {op}")
+
+    @staticmethod
+    def negate(symb1_val):
+        if symb1_val.__class__ is not bool:
+            error_exit(53, "Error: instruction NOT requires bool argument.")
+        return not symb1_val
+
+    @staticmethod
+    def int2char(symb1_val):
+        if symb1_val.__class__ is not int:
+            error_exit(53, "Error: incorrect argument type.")
+        try:
+            return chr(symb1_val)
+        except (ValueError, OverflowError):
+            error_exit(58, "Error: Incorrect INT2CHAR number value.")
+
+    @staticmethod
+    def stri2int(string, pos):
+        if not ((string.__class__ is str or string.__class__ is StringBuffer) and pos.__class__ is int):
+            error_exit(53, "Error incorrect argument type.")
+        if not (0 <= pos <= len(string) - 1):
+            error_exit(58, "Error: indexing error.")
+        return ord(string[pos])
         
 
 ##################### the main "switch" block #####################################################
+# kept as the reference dispatch path, selected with --legacy-dispatch (see DISPATCH_TABLE for the default one)
 
     def interpret_instruction(self, instruction: Instruction):
         if instruction.name == "JUMP":
-            arg0 = instruction.args[0]
+            arg0 = instruction.operands[0]  # index of the label
             self.instruction_jump(arg0)
 
         elif instruction.name == "WRITE":
@@ -544,41 +1058,24 @@ class Program:
             pass
 
         elif instruction.name == "CREATEFRAME":
-            self.temporaryFrame = {}
+            self.instruction_createframe()
             
         elif instruction.name == "PUSHFRAME":
-            if self.temporaryFrame == None:
-                error_exit(55, "Error: undefined Temporary Frame.")
-            self.localFrame = self.temporaryFrame
-            self.frameStack.append(self.temporaryFrame)
-            self.temporaryFrame = None
+            self.instruction_pushframe()
 
         elif instruction.name == "POPFRAME":
-            if not self.frameStack:
-                error_exit(55, "Error: Frame Stack is empty, nothing to pop.")
-            self.temporaryFrame = self.frameStack.pop()
-            # re-set the data in localFrame to reflect top frame at the stack, if the stack is empty, LF is empty too
-            if not self.frameStack:
-                self.localFrame = None
-            else:
-                self.localFrame = self.frameStack[-1]
+            self.instruction_popframe()
 
         elif instruction.name == "DEFVAR":
             arg0 = instruction.args[0].variable
             self.instruction_defvar(arg0)
 
         elif instruction.name == "CALL":
-            self.call_stack.append(self.instruction_counter)
-
-            target_label = instruction.args[0].literalValue
-            if target_label not in self.program_labels.keys():
-                error_exit(52, "Error: jumping to unknown label.")
-            self.instruction_counter = self.program_labels[target_label]
+            arg0 = instruction.operands[0]  # index of the label
+            self.instruction_call(arg0)
 
         elif instruction.name == "RETURN":
-            if not self.call_stack:
-                error_exit(56, "Error: call stack empty.")
-            self.instruction_counter = self.call_stack.pop()
+            self.instruction_return()
 
         elif instruction.name == "BREAK":
             pass
@@ -593,10 +1090,7 @@ class Program:
 
         elif instruction.name == "PUSHS":
             arg0 = instruction.args[0]
-            if arg0.type == "var":
-                self.data_stack.append((self.get_var_type(arg0.variable), self.get_var_value(arg0.variable))) # using a tuple to hold both the type and value of the literal
-            else:
-                self.data_stack.append((arg0.type, arg0.literalValue))
+            self.instruction_pushs(arg0)
 
         elif instruction.name == "POPS":
             arg0 = instruction.args[0].variable
@@ -670,122 +1164,1524 @@ class Program:
             self.instruction_type(arg0, arg1)
 
         elif instruction.name == "JUMPIFEQ":
-            arg0 = instruction.args[0]
+            arg0 = instruction.operands[0]  # index of the label
             arg1 = instruction.args[1]
             arg2 = instruction.args[2]
             self.instruction_jumpifeq(arg0, arg1, arg2)
 
         elif instruction.name == "JUMPIFNEQ":
-            arg0 = instruction.args[0]
+            arg0 = instruction.operands[0]  # index of the label
             arg1 = instruction.args[1]
             arg2 = instruction.args[2]
-            self.instruction_jumpifeq(arg0, arg1, arg2)
+            self.instruction_jumpifneq(arg0, arg1, arg2)
 
         elif instruction.name == "EXIT":
             arg0 = instruction.args[0]
             self.instruction_exit(arg0)
 
+        elif instruction.name == "CLEARS":
+            self.instruction_clears()
+
+        elif instruction.name in ("ADDS", "SUBS", "MULS", "IDIVS"):
+            self.instruction_stack_arithmetic(instruction.name[:-1])
+
+        elif instruction.name in ("LTS", "GTS", "EQS"):
+            self.instruction_stack_compare(instruction.name[:-1])
+
+        elif instruction.name in ("ANDS", "ORS"):
+            self.instruction_stack_andor(instruction.name[:-1])
+
+        elif instruction.name == "NOTS":
+            self.instruction_stack_not()
+
+        elif instruction.name == "INT2CHARS":
+            self.instruction_stack_int2char()
+
+        elif instruction.name == "STRI2INTS":
+            self.instruction_stack_stri2int()
+
+        elif instruction.name == "JUMPIFEQS":
+            arg0 = instruction.operands[0]  # index of the label
+            self.instruction_jumpifeqs(arg0)
+
+        elif instruction.name == "JUMPIFNEQS":
+            arg0 = instruction.operands[0]  # index of the label
+            self.instruction_jumpifneqs(arg0)
+
 
         else:
             error_exit(32, "Error: Unknown instruction opcode.")
 
-    def interpret(self):
-        while self.instruction_counter < len(self.program_instructions):
-            self.interpret_instruction(self.program_instructions[self.instruction_counter])
+    def interpret(self, legacy_dispatch:bool=False, stats=None, monitors=None, debugger=None, trace=None):
+        if debugger is not None:
+            self.interpret_with_debugger(debugger, legacy_dispatch)
+            return
+        if trace is not None:
+            self.interpret_with_trace(trace, legacy_dispatch)
+            return
+        if stats is not None:
+            self.interpret_with_stats(stats, legacy_dispatch)
+            return
+        if monitors:
+            self.interpret_in_slices(monitors, legacy_dispatch)
+            return
+        if legacy_dispatch:
+            while self.instruction_counter < len(self.program_instructions):
+                self.interpret_instruction(self.program_instructions[self.instruction_counter])
+                self.instruction_counter += 1
+            return
+
+        instructions = self.program_instructions
+        instruction_count = len(instructions)
+        while self.instruction_counter < instruction_count:
+            instruction = instructions[self.instruction_counter]
+            instruction.handler(*instruction.operands)
+            self.instruction_counter += 1
+
+    def execute(self, legacy_dispatch:bool=False, stats=None, monitors=None, debugger=None, trace=None):
+        # interprets the program and returns its exit code, the code of EXIT or 0, errors are raised
+        try:
+            self.interpret(legacy_dispatch, stats, monitors, debugger, trace)
+        except ProgramExit as program_exit:
+            return program_exit.code
+        return 0
+
+    def interpret_with_debugger(self, debugger, legacy_dispatch:bool=False):
+        # the loop of the debug mode, stops at the breakpoints, in single-step mode and on the changes of watched variables
+        instructions = self.program_instructions
+        instruction_count = len(instructions)
+        while self.instruction_counter < instruction_count:
+            index = self.instruction_counter
+            if debugger.stepping or index in debugger.breakpoints:
+                debugger.stop(index, "breakpoint" if index in debugger.breakpoints else "step")
+            instruction = instructions[index]
+            if legacy_dispatch and instruction.name not in Debugger.HANDLERS:
+                self.interpret_instruction(instruction)
+            else:
+                instruction.handler(*instruction.operands)
+            self.instruction_counter += 1
+            debugger.steps += 1
+            if debugger.watches:
+                debugger.check_watches(index)
+
+    def interpret_with_trace(self, trace, legacy_dispatch:bool=False):
+        # the loop of --trace, every step writes the index, the opcode and the type of the result into the ring buffer
+        # of the recorder (preallocated arrays, nothing is allocated per step), the buffer is dumped on an error
+        instructions = self.program_instructions
+        instruction_count = len(instructions)
+        frames = self.frames
+        indexes, opcodes, results = trace.indexes, trace.opcodes, trace.results
+        opcode_ids, targets = trace.opcode_ids, trace.targets
+        mask = trace.size - 1
+        no_result = TraceRecorder.NO_RESULT
+        steps = 0
+        try:
+            while self.instruction_counter < instruction_count:
+                index = self.instruction_counter
+                position = steps & mask
+                indexes[position] = index
+                opcodes[position] = opcode_ids[index]
+                instruction = instructions[index]
+                if legacy_dispatch:
+                    self.interpret_instruction(instruction)
+                else:
+                    instruction.handler(*instruction.operands)
+                target = targets[index]
+                results[position] = no_result if target is None else TYPE_OF_VALUE[frames[target.frame_index][target.slot].__class__]
+                self.instruction_counter += 1
+                steps += 1
+        except InterpreterError as error:
+            results[steps & mask] = TraceRecorder.PENDING
+            trace.steps = steps + 1     # with the failed instruction
+            trace.dump(error)
+            raise
+        trace.steps = steps
+
+    def interpret_with_stats(self, stats, legacy_dispatch:bool=False):
+        # the same loop as in interpret(), measuring every executed instruction for --stats,
+        # it's kept apart so that the normal loop doesn't pay anything for it
+        instructions = self.program_instructions
+        instruction_count = len(instructions)
+        stats.instructions = instructions
+        counts = stats.counts = [0] * instruction_count
+        times = stats.times = [0.0] * instruction_count
+        frames = self.frames
+        clock = time.perf_counter
+        while self.instruction_counter < instruction_count:
+            index = self.instruction_counter
+            instruction = instructions[index]
+            operands = instruction.operands
+            counts[index] += 1
+
+            # the count of initialised variables only grows when a declared variable gets its first value
+            # and only drops when CREATEFRAME or POPFRAME throws the temporary frame away
+            target = operands[0] if operands and operands[0].__class__ is Variable else None
+            frame = frames[target.frame_index] if target is not None else None
+            previous = frame[target.slot] if frame is not None else None
+            if instruction.name in ("CREATEFRAME", "POPFRAME"):
+                stats.variables -= stats.count_initialised(frames[2])
+
+            start = clock()
+            if legacy_dispatch:
+                self.interpret_instruction(instruction)
+            else:
+                instruction.handler(*operands)
+            times[index] += clock() - start
+
+            if previous is UNINITIALISED and frame[target.slot].__class__ is not Missing:
+                stats.variables += 1
+                if stats.variables > stats.peak_variables:
+                    stats.peak_variables = stats.variables
+            if len(self.data_stack) > stats.peak_data_stack:
+                stats.peak_data_stack = len(self.data_stack)
+            if len(self.frameStack) > stats.peak_frame_stack:
+                stats.peak_frame_stack = len(self.frameStack)
             self.instruction_counter += 1
-            # self.print_stack()
- 
 
 
-def get_source_xml(file):
-    if(file is not None):
+    def interpret_in_slices(self, monitors, legacy_dispatch:bool=False):
+        # Runs the instructions in slices and calls the monitors (Checkpoint, Limits) between them, the loop inside
+        # a slice only counts the steps. Every monitor says how many steps it can wait in .remaining.
+        instructions = self.program_instructions
+        instruction_count = len(instructions)
+        while True:
+            steps = min(monitor.remaining for monitor in monitors)
+            if legacy_dispatch:
+                for _ in range(steps):
+                    if self.instruction_counter >= instruction_count:
+                        return
+                    self.interpret_instruction(instructions[self.instruction_counter])
+                    self.instruction_counter += 1
+            else:
+                for _ in range(steps):
+                    if self.instruction_counter >= instruction_count:
+                        return
+                    instruction = instructions[self.instruction_counter]
+                    instruction.handler(*instruction.operands)
+                    self.instruction_counter += 1
+            if self.instruction_counter >= instruction_count:
+                return
+            for monitor in monitors:
+                monitor.advance(self, steps)
+
+
+# conversion of an input line for every type READ accepts
+INPUT_CONVERSIONS = {"int": read_int, "bool": read_bool, "string": Program.decode_escape_sequences}
+
+
+class Checkpoint:
+    # State of an interrupted run (--checkpoint-every, --checkpoint-file, --resume): the frames, the frame, call and data
+    # stacks, the instruction counter, the count of input lines read and the size of the --output file. The state is
+    # written by a forked child, which has a copy-on-write image of the interpreter, so the interpretation only stops
+    # for the fork (without fork() it's written right away). The file is written into a temporary file and renamed,
+    # so a crash while writing leaves the previous checkpoint in place. The checkpoint is tied to the loaded program
+    # by the hash of its serialized form, including the -O changes.
+    VERSION = 1
+    # values that marshal can't store
+    ENCODED = {NIL: (0,), UNDECLARED: (1,), UNINITIALISED: (2,)}
+    DECODED = {0: NIL, 1: UNDECLARED, 2: UNINITIALISED}
+
+    def __init__(self, program:Program, checkpoint_file, every:int=0):
+        self.checkpoint_file = checkpoint_file
+        self.every = every
+        self.remaining = every
+        self.child = None
+        self.fingerprint = hashlib.sha256(marshal.dumps(program.serialize())).hexdigest()
+
+    @classmethod
+    def encode(cls, value):
+        if value.__class__ is StringBuffer:
+            return (3, value.text())
+        return cls.ENCODED.get(value, value)
+
+    @classmethod
+    def decode(cls, value):
+        if value.__class__ is not tuple:
+            return value
+        if value[0] == 3:
+            return StringBuffer(value[1])
+        return cls.DECODED[value[0]]
+
+    def encode_frame(self, frame):
+        return None if frame is None else [self.encode(value) for value in frame]
+
+    def decode_frame(self, frame):
+        return None if frame is None else [self.decode(value) for value in frame]
+
+    def state(self, program:Program):
+        return {
+            "version": self.VERSION,
+            "program": self.fingerprint,
+            "instruction_counter": program.instruction_counter,
+            "global_frame": self.encode_frame(program.frames[0]),
+            "temporary_frame": self.encode_frame(program.frames[2]),
+            "frame_stack": [self.encode_frame(frame) for frame in program.frameStack],
+            "call_stack": program.call_stack,
+            "data_stack": [self.encode(value) for value in program.data_stack],
+            "input_lines": program.user_input.lines_read() if program.user_input is not None else 0,
+            "output_size": program.output.written,
+        }
+
+    def write(self, program:Program):
+        directory = os.path.dirname(os.path.abspath(self.checkpoint_file))
+        with tempfile.NamedTemporaryFile(dir=directory, prefix=".checkpoint", delete=False) as file:
+            file.write(marshal.dumps(self.state(program)))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(file.name, self.checkpoint_file)
+
+    def advance(self, program:Program, steps:int):
+        self.remaining -= steps
+        if self.remaining <= 0:
+            self.save(program)
+            self.remaining = self.every
+
+    def save(self, program:Program):
+        # the output written so far belongs to the checkpoint
+        program.output.flush()
+        self.wait()
+        if not hasattr(os, "fork"):
+            self.write(program)
+            return
+        child = os.fork()
+        if child:
+            self.child = child
+            return
+        code = 1
         try:
-            return ET.parse(file)
+            self.write(program)
+            code = 0
+        finally:
+            os._exit(code)
 
-        except FileNotFoundError:
-            error_exit(11, "Source file not found.")
-        except ET.ParseError:
-            error_exit(31, "Error: source XML isn't properly formed.")
-    else:
+    def wait(self):
+        if self.child is None:
+            return
+        _, status = os.waitpid(self.child, 0)
+        self.child = None
+        if status != 0:
+            sys.stderr.write("Warning: checkpoint couldn't be written.\n")
+
+    def read(self):
         try:
-            return ET.parse(sys.stdin)
-        except ET.ParseError:
-            error_exit(31, "Error: source XML isn't properly formed.")
- 
+            with open(self.checkpoint_file, "rb") as file:
+                state = marshal.loads(file.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            error_exit(11, "Checkpoint file can't be read.")
+        if not isinstance(state, dict) or state.get("version") != self.VERSION:
+            error_exit(11, "Checkpoint file can't be read.")
+        if state["program"] != self.fingerprint:
+            error_exit(11, "The checkpoint belongs to a different program.")
+        return state
+
+    def restore(self, program:Program, state):
+        program.instruction_counter = state["instruction_counter"]
+        program.frames[0] = self.decode_frame(state["global_frame"])
+        program.frames[2] = self.decode_frame(state["temporary_frame"])
+        program.frameStack = [self.decode_frame(frame) for frame in state["frame_stack"]]
+        program.frames[1] = program.frameStack[-1] if program.frameStack else None
+        program.call_stack = list(state["call_stack"])
+        program.data_stack = [self.decode(value) for value in state["data_stack"]]
+        program.user_input.skip(state["input_lines"])
+
+
+class Limits:
+    # Limits of --max-steps, --max-seconds and --max-memory for untrusted programs. They are checked between the slices
+    # of interpret_in_slices(), at most CHECK_INTERVAL steps apart, so the loop inside a slice pays nothing for them.
+    # The memory is the estimated size of the frames, the data and call stack and the values in them (strings
+    # included), it's walked only every few slices, the more values there are, the less often (see measure_memory()).
+    # CONCAT is the one instruction that can outgrow the limit within a slice (a string doubled in a loop), with a
+    # memory limit the program runs the CONCAT of Limits, which adds up the growth and measures the memory in time.
+    CHECK_INTERVAL = 1 << 12
+    STEPS_EXCEEDED, TIME_EXCEEDED, MEMORY_EXCEEDED = 60, 61, 62
+
+    def __init__(self, program:Program, max_steps:int=None, max_seconds:float=None, max_memory:int=None):
+        self.program = program
+        self.max_steps = max_steps
+        self.max_seconds = max_seconds
+        self.max_memory = max_memory
+        self.steps = 0
+        self.remaining = self.CHECK_INTERVAL if max_steps is None else min(self.CHECK_INTERVAL, max_steps)
+        self.deadline = time.perf_counter() + max_seconds if max_seconds is not None else None
+        self.memory_countdown = 0
+        self.measured_memory = self.measured_steps = 0
+        # the fastest growth of the memory per step seen between two measurements
+        self.growth_rate = 0
+        # bytes of strings made by CONCAT since the last measurement
+        self.concatenated = 0
+        if max_memory is not None:
+            program.concat_hook = self.concat
+
+    def advance(self, program:Program, steps:int):
+        self.steps += steps
+        if self.max_steps is not None:
+            if self.steps >= self.max_steps:
+                self.stop(program, self.STEPS_EXCEEDED, f"Step limit of {self.max_steps} instructions exceeded")
+            self.remaining = min(self.CHECK_INTERVAL, self.max_steps - self.steps)
+        else:
+            self.remaining = self.CHECK_INTERVAL
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            self.stop(program, self.TIME_EXCEEDED, f"Time limit of {self.max_seconds:g} s exceeded")
+        if self.max_memory is not None:
+            self.memory_countdown -= steps
+            if self.memory_countdown <= 0:
+                self.check_memory(program)
+            # the next slice ends at the next measurement
+            self.remaining = max(1, min(self.remaining, self.memory_countdown))
+
+    def check_memory(self, program:Program, executed:bool=True):
+        memory, values = self.measure_memory(program)
+        if memory > self.max_memory:
+            self.stop(program, self.MEMORY_EXCEEDED, f"Memory limit of {self.max_memory} bytes exceeded ({memory} bytes used)", executed)
+        # the walk over the values costs a fraction of the steps executed until the next one, unless the memory could
+        # reach the limit sooner at the fastest growth seen so far (a pause in the growth doesn't lower it), there's
+        # at least a whole slice in between
+        if executed and self.steps > self.measured_steps:
+            self.growth_rate = max(self.growth_rate, (memory - self.measured_memory) / (self.steps - self.measured_steps))
+        countdown = max(8 * values, self.CHECK_INTERVAL)
+        if self.growth_rate > 0:
+            countdown = min(countdown, max(self.CHECK_INTERVAL, int((self.max_memory - memory) / self.growth_rate / 2)))
+        self.memory_countdown = countdown
+        self.measured_memory, self.measured_steps = memory, self.steps
+        self.concatenated = 0
+
+    def concat(self, var, symb1, string1, string2):
+        # concat_hook of a program with a memory limit, the memory is measured as soon as the strings made since
+        # the last measurement could have used up what was left under the limit
+        program = self.program
+        size = sys.getsizeof(string1)
+        try:
+            program.concat(var, symb1, string1, string2)
+        except MemoryError:
+            self.stop(program, self.MEMORY_EXCEEDED, f"Memory limit of {self.max_memory} bytes exceeded (out of memory)", False)
+        string = program.frames[var.frame_index][var.slot]
+        # a buffer extended in place only grew
+        self.concatenated += sys.getsizeof(string) - (size if string is string1 else 0)
+        if self.concatenated > self.max_memory - self.measured_memory:
+            self.check_memory(program, False)
 
-def error_exit(err_code, err_msg):
-    sys.stderr.write(err_msg)
-    exit(err_code)
+    @staticmethod
+    def measure_memory(program:Program):
+        getsizeof = sys.getsizeof
+        containers = [program.data_stack, program.call_stack, program.frameStack, program.frames[0], program.frames[2], *program.frameStack]
+        memory = values = 0
+        for container in containers:
+            if container is not None:
+                memory += getsizeof(container) + sum(map(getsizeof, container))
+                values += len(container)
+        return memory, values
+
+    def stop(self, program:Program, code:int, reason:str, executed:bool=True):
+        # between the slices the steps are counted and the instruction at the counter hasn't been executed yet, within
+        # a slice (executed=False) the instruction at the counter is the one stopped
+        if executed:
+            position = f"after {self.steps} steps, stopped before"
+        else:
+            position = f"after more than {self.steps} steps, stopped at"
+        error_exit(code, f"{reason} {position} {program.location(program.instruction_counter)}, "
+                         f"call depth {len(program.call_stack)}.\n")
+
+
+class Statistics:
+    # Execution statistics of --stats, the groups are written in the order they were given on the command line:
+    #   insts - executed instructions in total and per opcode with the time spent in them
+    #   hot   - the most executed instructions by their order
+    #   vars  - peak count of initialised variables in all frames
+    #   stack - peak depth of the data stack and of the frame stack
+    GROUPS = ("insts", "hot", "vars", "stack")
+    HOT_COUNT = 10
+
+    def __init__(self, groups=None):
+        self.groups = groups or self.GROUPS
+        self.instructions = []
+        self.counts = []
+        self.times = []
+        self.variables = 0
+        self.peak_variables = 0
+        self.peak_data_stack = 0
+        self.peak_frame_stack = 0
 
-def check_if_xml_valid(xml):
-    root = xml.getroot()
-    last_order_value = 0
-    if root.tag != "program":
-        error_exit(32, "Missing a program tag in the xml header.")
-    try:
-        if root.attrib["language"].lower() != "ippcode22":
-            error_exit(32, "Wrong language attribute.")
-    except KeyError:
-        error_exit(32, "Missing language attribute completely.")
-    for child in root:
-        if child.tag != "instruction":
-            error_exit(32, "Wrong format of XML - instruction tag missing.")
+    @staticmethod
+    def count_initialised(frame):
+        if frame is None:
+            return 0
+        return sum(1 for value in frame if value.__class__ is not Missing)
+
+    def report_insts(self):
+        opcodes = {}
+        for instruction, count, spent in zip(self.instructions, self.counts, self.times):
+            if count:
+                opcode_count, opcode_time = opcodes.get(instruction.name, (0, 0.0))
+                opcodes[instruction.name] = (opcode_count + count, opcode_time + spent)
+        lines = [f"instructions: {sum(self.counts)}"]
+        for name, (count, spent) in sorted(opcodes.items(), key=lambda item: -item[1][0]):
+            lines.append(f"  {name:<22}{count:>12}{spent:>12.6f}s")
+        return lines
+
+    def report_hot(self):
+        executed = [index for index, count in enumerate(self.counts) if count]
+        executed.sort(key=lambda index: (-self.counts[index], self.instructions[index].order))
+        lines = ["hot:"]
+        for index in executed[:self.HOT_COUNT]:
+            instruction = self.instructions[index]
+            lines.append(f"  order {instruction.order:<10}{instruction.name:<22}{self.counts[index]:>12}")
+        return lines
+
+    def report_vars(self):
+        return [f"peak variables: {self.peak_variables}"]
+
+    def report_stack(self):
+        return [f"peak data stack: {self.peak_data_stack}", f"peak frame stack: {self.peak_frame_stack}"]
+
+    def write(self, stats_file):
+        lines = []
+        for group in self.groups:
+            lines += getattr(self, f"report_{group}")()
         try:
-            if child.attrib["opcode"] == None:
-                error_exit(32, "Missing opcode attribute.")
+            with open(stats_file, "w") as file:
+                file.write("\n".join(lines) + "\n")
+        except OSError:
+            error_exit(12, "Statistics file can't be opened.")
+
+
+
+class ProgramCache:
+    # Cache of loaded programs (--cache-dir). An entry is the marshalled Program.serialize() of a successfully loaded
+    # source, named by the sha256 of the source bytes together with the interpreter's own source and the Python version,
+    # so any change of either gives a new name. Entries are written into a temporary file and renamed into place,
+    # concurrent runs therefore never see a partial entry, and an unreadable entry is simply loaded again from the XML.
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        digest = hashlib.sha256(sys.version.encode())
+        with open(__file__, "rb") as interpreter:
+            digest.update(interpreter.read())
+        self.interpreter_version = digest.digest()
+
+    def source_key(self, source):
+        # returns the key and the source to load from, stdin can only be read once so it's kept in memory
+        digest = hashlib.sha256(self.interpreter_version)
+        if isinstance(source, str):
+            try:
+                with open(source, "rb") as file:
+                    for chunk in iter(lambda: file.read(1 << 20), b""):
+                        digest.update(chunk)
+            except OSError:
+                return None, source     # reported by save_instructions()
+        else:
+            source = io.BytesIO(source.read())
+            digest.update(source.getbuffer())
+        return digest.hexdigest(), source
 
-            if child.attrib["order"] == None:
-                error_exit(32, "Missing order attribute.")
-        except KeyError:
-            error_exit(32, "Missing XML attribute.")
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ".ippc")
 
-        if int(child.attrib["order"]) <= 0:
-                error_exit(32, "Error: incorrect order value of the instruction.")
+    def load(self, program:Program, key):
+        try:
+            with open(self.entry_path(key), "rb") as file:
+                data = marshal.loads(file.read())    # much faster than marshal.load() reading the file piece by piece
+        except (OSError, EOFError, ValueError, TypeError):
+            return False
+        program.load_serialized(data)
+        return True
 
-        if int(child.attrib["order"]) <= last_order_value:
-                error_exit(32, "Error: duplicit order.")
+    def store(self, program:Program, key):
+        # the cache only saves time, a cache directory that can't be written to doesn't stop the interpretation
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            file = tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix=".tmp", delete=False)
+        except OSError:
+            return
+        try:
+            with file:
+                marshal.dump(program.serialize(), file)
+            os.replace(file.name, self.entry_path(key))
+        except (OSError, ValueError):
+            try:
+                os.unlink(file.name)
+            except OSError:
+                pass
+
+    def load_program(self, program:Program, source):
+        key, source = self.source_key(source)
+        if key is not None and self.load(program, key):
+            return
+        program.save_instructions(source)
+        if key is not None:
+            self.store(program, key)
+
+
+class Profiler:
+    # Sampling profiler of --profile. SIGPROF interrupts the interpretation every interval seconds of CPU time and the
+    # handler records the call stack together with the instruction counter, nothing is added to the dispatch loop.
+    # Every address is mapped to the nearest preceding label, the samples are written as folded stacks
+    # ("main;fact;fact 42") for the flamegraph tools.
+    def __init__(self, program:Program, interval:float=0.001):
+        if not hasattr(signal, "setitimer"):
+            error_exit(10, "Profiling isn't supported on this platform.")
+        self.program = program
+        self.interval = interval
+        # (stack node, instruction counter) -> count, the call stacks are nodes of a trie of (parent node, address),
+        # node -1 is the empty stack
+        self.samples = {}
+        self.nodes = {}
+        self.node_keys = []
+        # the call stack of the last sample and the node of each of its prefixes
+        self.stack = []
+        self.path = []
+
+    def sample(self, signum, frame):
+        # Only the part of the call stack that changed since the last sample is looked up in the trie, the unchanged
+        # part is found by comparing the lists (in C, no copy of a deep stack is built or hashed).
+        call_stack = self.program.call_stack
+        stack = self.stack
+        common = len(stack)
+        if len(call_stack) > common:
+            same = call_stack[:common] == stack
+        elif len(call_stack) < common:
+            common = len(call_stack)
+            same = stack[:common] == call_stack
+        else:
+            same = call_stack == stack
+        if not same:
+            # the longest common prefix by bisection
+            low, high = 0, common - 1
+            while low < high:
+                middle = (low + high + 1) // 2
+                if call_stack[:middle] == stack[:middle]:
+                    low = middle
+                else:
+                    high = middle - 1
+            common = low
+        path = self.path
+        del stack[common:]
+        del path[common:]
+        node = path[-1] if path else -1
+        if len(call_stack) > common:
+            for address in call_stack[common:]:
+                key = (node, address)
+                node = self.nodes.get(key)
+                if node is None:
+                    node = self.nodes[key] = len(self.node_keys)
+                    self.node_keys.append(key)
+                path.append(node)
+            stack.extend(call_stack[common:])
+        key = (node, self.program.instruction_counter)
+        self.samples[key] = self.samples.get(key, 0) + 1
+
+    def start(self):
+        signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+
+    def folded_stacks(self):
+        # a jump to a label continues with the instruction after the label index, that's where the label's code starts
+        starts = sorted((index + 1, label) for label, index in self.program.program_labels.items())
+        start_indexes = [start for start, _ in starts]
+
+        def label_at(index):
+            position = bisect_right(start_indexes, index)
+            return starts[position - 1][1] if position else "main"
+
+        # the labels of every sampled node, a parent before its children (it has a lower number), so a deep stack is
+        # only walked up to the nearest sampled node below it
+        folded = {}
+        for node in sorted({node for node, _ in self.samples}):
+            labels = []
+            parent = node
+            while parent != -1 and parent not in folded:
+                parent, address = self.node_keys[parent]
+                labels.append(label_at(address))
+            if parent != -1:
+                labels.append(folded[parent])
+            folded[node] = ";".join(reversed(labels))
+
+        stacks = {}
+        for (node, counter), count in self.samples.items():
+            stack = f"{folded[node]};{label_at(counter)}" if node != -1 else label_at(counter)
+            stacks[stack] = stacks.get(stack, 0) + count
+        return [f"{stack} {count}" for stack, count in sorted(stacks.items())]
+
+    def write(self, profile_file):
+        self.stop()
+        try:
+            with open(profile_file, "w") as file:
+                file.writelines(line + "\n" for line in self.folded_stacks())
+        except OSError:
+            error_exit(12, "Profile file can't be opened.")
+
+
+class TraceRecorder:
+    # Ring buffer of --trace with the last size executed instructions: the index, the opcode id and the type tag of the
+    # written variable of each, in three preallocated arrays. When the program ends with an error, the buffer is written
+    # into the trace file in the order of execution, tracedump.py renders it against the source.
+    # File: header (TRACE_HEADER), error message, opcode names separated by newlines, then the little-endian arrays.
+    MAGIC = b"IPPTRACE"
+    VERSION = 1
+    TRACE_HEADER = struct.Struct("<8sHIQH32sII")    # magic, version, entries, steps, exit code, program hash, sizes
+    PENDING = 254       # the instruction didn't finish, the one that failed
+    NO_RESULT = 255     # the instruction doesn't write a variable
+
+    def __init__(self, program:Program, trace_file, size:int=1 << 16):
+        self.program = program
+        self.trace_file = trace_file
+        # a power of two, so that the position is a mask of the step count
+        self.size = 1 << max(size - 1, 1).bit_length()
+        self.indexes = array("I", [0]) * self.size
+        self.opcodes = array("H", [0]) * self.size
+        self.results = array("B", [0]) * self.size
+        self.steps = 0
+        instructions = program.program_instructions
+        self.names = sorted({instruction.name for instruction in instructions})
+        opcode_ids = {name: opcode_id for opcode_id, name in enumerate(self.names)}
+        self.opcode_ids = array("H", [opcode_ids[instruction.name] for instruction in instructions])
+        self.targets = [self.target(instruction) for instruction in instructions]
 
-        last_order_value = int(child.attrib["order"])
-        arg_num = 1
-        for grandchild in child:
-            if grandchild.tag not in ("arg1", "arg2", "arg3"):
-                error_exit(32, "Wrong format of XML - wrong arg tag.")
-            if grandchild.tag != f"arg{arg_num}":
-                error_exit(32, "Wrong format of XML - wrong arg tag.")
-            arg_num += 1
+    @staticmethod
+    def target(instruction:Instruction):
+        # the variable the instruction writes, its type is recorded after the instruction
+        name = instruction.name.split("+")[0]
+        if (name in TypeInference.RESULTS or name in ("MOVE", "READ")) and instruction.args and instruction.args[0].type == TYPE_VAR:
+            return instruction.args[0].variable
+        return None
+
+    @staticmethod
+    def fingerprint(program:Program):
+        return hashlib.sha256(marshal.dumps(program.serialize())).digest()
+
+    def ordered(self, values):
+        # the recorded entries from the oldest one, little-endian
+        if self.steps <= self.size:
+            values = values[:self.steps]
+        else:
+            position = self.steps & (self.size - 1)
+            values = values[position:] + values[:position]
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values.tobytes()
+
+    def dump(self, error):
+        message = error.message.encode("utf-8")
+        names = "\n".join(self.names).encode("utf-8")
+        try:
+            with open(self.trace_file, "wb") as file:
+                file.write(self.TRACE_HEADER.pack(self.MAGIC, self.VERSION, min(self.steps, self.size), self.steps, error.code,
+                                                  self.fingerprint(self.program), len(message), len(names)))
+                file.write(message)
+                file.write(names)
+                for values in (self.indexes, self.opcodes, self.results):
+                    file.write(self.ordered(values))
+        except OSError:
+            sys.stderr.write("Warning: trace file can't be written.\n")
+
+    @classmethod
+    def read(cls, trace_file):
+        # (steps, exit code, message, program hash, [(index, opcode name, result type tag)]) of a trace file
+        with open(trace_file, "rb") as file:
+            data = file.read()
+        magic, version, entries, steps, code, fingerprint, message_size, names_size = cls.TRACE_HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError("not a trace file")
+        offset = cls.TRACE_HEADER.size
+        message = data[offset:offset + message_size].decode("utf-8")
+        offset += message_size
+        names = data[offset:offset + names_size].decode("utf-8").split("\n")
+        offset += names_size
+        columns = []
+        for typecode in ("I", "H", "B"):
+            values = array(typecode)
+            values.frombytes(data[offset:offset + entries * values.itemsize])
+            if sys.byteorder == "big":
+                values.byteswap()
+            offset += entries * values.itemsize
+            columns.append(values)
+        entries = [(index, names[opcode], result) for index, opcode, result in zip(*columns)]
+        return steps, code, message, fingerprint, entries
+
+
+class Debugger:
+    # Debug mode (--debug, --break, --watch, --step). The program runs through interpret_with_debugger(), a loop of its
+    # own, and BREAK and DPRINT get handlers writing to stderr, so the normal loop and handlers stay as they are.
+    # At a stop the state is written to stderr and commands are read from the terminal (or from stdin when the input
+    # of the program comes from a file), without either the debugger only reports the stops and goes on.
+    HANDLERS = {"BREAK": "instruction_break", "DPRINT": "instruction_dprint"}
+    HELP = ("c(ontinue), s(tep), p(rint) <var>, state, b(reak) <order|label>, d(elete) <order|label>, w(atch) <var>, "
+            "u(nwatch) <var>, q(uit); an empty line repeats the last command\n")
+
+    def __init__(self, program:Program, breakpoints=(), watches=(), step:bool=False, commands=None):
+        self.program = program
+        self.breakpoints = {self.breakpoint_index(breakpoint) for breakpoint in breakpoints}
+        self.watches = {}
+        for name in watches:
+            self.add_watch(name)
+        self.stepping = step
+        self.commands = commands
+        self.last_command = "s"
+        self.steps = 0
+        for instruction in program.program_instructions:
+            if instruction.name in self.HANDLERS:
+                instruction.handler = getattr(self, self.HANDLERS[instruction.name])
+
+    def breakpoint_index(self, breakpoint):
+        # an order number or a label, a label breaks before the first instruction after it
+        program = self.program
+        if breakpoint.isdigit():
+            for index, instruction in enumerate(program.program_instructions):
+                if instruction.order == int(breakpoint):
+                    return index
+            error_exit(10, f"No instruction with order {breakpoint}.")
+        if breakpoint not in program.program_labels:
+            error_exit(10, f"Unknown label {breakpoint}.")
+        return program.program_labels[breakpoint] + 1
+
+    def add_watch(self, name):
+        frame, _, variable = name.partition("@")
+        slots = self.program.global_slots if frame == "GF" else self.program.local_slots
+        if frame not in FRAME_INDEXES or variable not in slots:
+            error_exit(10, f"Unknown variable {name}.")
+        self.watches[name] = (FRAME_INDEXES[frame], slots[variable], self.read(FRAME_INDEXES[frame], slots[variable]))
+
+    def read(self, frame_index, slot):
+        # the content of the slot with its class, so that 1 and true differ, None when the frame doesn't exist
+        frame = self.program.frames[frame_index]
+        if frame is None:
+            return None
+        value = frame[slot]
+        if value.__class__ is StringBuffer:
+            value = value.text()
+        return value.__class__, value
+
+    def describe(self, content):
+        return "no frame" if content is None else repr(content[1])
+
+    def check_watches(self, index):
+        changes = []
+        for name, (frame_index, slot, last) in self.watches.items():
+            content = self.read(frame_index, slot)
+            if content != last:
+                self.watches[name] = (frame_index, slot, content)
+                changes.append(f"{name}: {self.describe(last)} -> {self.describe(content)}")
+        if changes:
+            self.stop(self.program.instruction_counter, f"watch after {self.program.location(index)}, " + ", ".join(changes))
+
+    def print_state(self):
+        sys.stderr.write(f"{self.steps} instructions executed")
+        self.program.print_stack(sys.stderr)
+
+    def stop(self, index, reason):
+        program = self.program
+        where = program.location(index) if index < len(program.program_instructions) else "the end of the program"
+        sys.stderr.write(f"[{reason}] before {where}\n")
+        if self.commands is None:
+            return
+        while True:
+            sys.stderr.write("(debug) ")
+            sys.stderr.flush()
+            line = self.commands.readline()
+            if not line:
+                # no more commands, the program runs to the end
+                self.commands = None
+                self.stepping = False
+                return
+            command, _, argument = (line.strip() or self.last_command).partition(" ")
+            self.last_command = f"{command} {argument}".strip()
+            argument = argument.strip()
+            if command in ("c", "continue"):
+                self.stepping = False
+                return
+            if command in ("s", "step"):
+                self.stepping = True
+                return
+            if command in ("q", "quit"):
+                raise ProgramExit(0)
+            try:
+                if command in ("p", "print"):
+                    if argument not in self.watches:
+                        self.add_watch(argument)
+                        content = self.watches.pop(argument)[2]
+                    else:
+                        content = self.watches[argument][2]
+                    sys.stderr.write(f"{argument} = {self.describe(content)}\n")
+                elif command == "state":
+                    self.print_state()
+                elif command in ("b", "break"):
+                    self.breakpoints.add(self.breakpoint_index(argument))
+                elif command in ("d", "delete"):
+                    self.breakpoints.discard(self.breakpoint_index(argument))
+                elif command in ("w", "watch"):
+                    self.add_watch(argument)
+                elif command in ("u", "unwatch"):
+                    self.watches.pop(argument, None)
+                else:
+                    sys.stderr.write(self.HELP)
+            except UsageError as error:
+                sys.stderr.write(error.message + "\n")
+
+    def instruction_break(self):
+        sys.stderr.write(f"BREAK at {self.program.location(self.program.instruction_counter)}, ")
+        self.print_state()
+
+    def instruction_dprint(self, symb1:Argument):
+        symbol_type = self.program.get_symbol_type(symb1)
+        value = self.program.get_symbol_value(symb1)
+        sys.stderr.write("nil" if symbol_type == TYPE_NIL else value_to_text(symbol_type, value))
+
+
+class Optimizer:
+    # Peephole optimizations of a loaded program (-O), run between save_instructions() and interpret():
+    #   - folding of arithmetic, comparisons, boolean and string operations and conditional jumps on literals
+    #   - threading of jumps that lead to another JUMP
+    #   - removal of LABEL, BREAK and DPRINT
+    #   - superinstructions: LT/GT/EQ followed by a conditional jump on the result, PUSHS followed by POPS
+    # Anything that would end with an error is left as it is, so the error codes stay the same.
+    NOPS = ("LABEL", "BREAK", "DPRINT")
+    JUMPS = ("JUMP", "CALL", "JUMPIFEQ", "JUMPIFNEQ", "JUMPIFEQS", "JUMPIFNEQS")
+
+    def __init__(self, program:Program, superinstructions:bool=True):
+        self.program = program
+        self.superinstructions = superinstructions
+
+    def optimize(self):
+        instructions = self.program.program_instructions
+        for index, instruction in enumerate(instructions):
+            instructions[index] = self.fold(instruction)
+        for instruction in instructions:
+            if instruction.name in self.JUMPS:
+                self.thread_jump(instruction.args[0])
+        self.compact()
+        # the indexes of the labels have changed, the jumps are resolved again
+        for instruction in self.program.program_instructions:
+            self.bind(instruction)
+
+    def make_instruction(self, name, args, order):
+        instruction = Instruction(name, order)
+        instruction.args = args
+        self.program.bind_instruction(instruction)
+        return instruction
+
+    def bind(self, instruction:Instruction):
+        if "+" not in instruction.name:
+            self.program.bind_instruction(instruction)
+            return
+        # superinstruction: var, symb1, symb2, op, label index, jump_when
+        operands = instruction.operands
+        label_index = self.program.label_index(instruction, instruction.args[-1])
+        instruction.operands = operands[:4] + (label_index,) + operands[5:]
 
-def sort_xml(parent, attr):
+    @staticmethod
+    def literal(value):
+        return Argument(TYPE_OF_VALUE[value.__class__], value)
+
+    def fold(self, instruction:Instruction):
+        args = instruction.args
+        if instruction.name not in ("ADD", "SUB", "MUL", "IDIV", "LT", "GT", "EQ", "AND", "OR", "NOT",
+                                    "CONCAT", "STRLEN", "JUMPIFEQ", "JUMPIFNEQ"):
+            return instruction
+        # type@ and label@ literals hold a str too, they are left to the checks of the handlers
+        if any(arg.type == TYPE_VAR or arg.type == TYPE_TYPE or arg.type == TYPE_LABEL for arg in args[1:]):
+            return instruction
+
+        values = [arg.literalValue for arg in args[1:]]
+        classes = [value.__class__ for value in values]
+        name = instruction.name
+        if name in ("ADD", "SUB", "MUL", "IDIV"):
+            if classes != [int, int] or (name == "IDIV" and values[1] == 0):
+                return instruction
+            result = Program.arithmetic(name, *values)
+        elif name in ("LT", "GT"):
+            if classes[0] is not classes[1] or values[0] is NIL:
+                return instruction
+            result = Program.compare(name, *values)
+        elif name in ("EQ", "JUMPIFEQ", "JUMPIFNEQ"):
+            if classes[0] is not classes[1] and NIL not in values:
+                return instruction
+            result = Program.equal(name, *values)
+        elif name in ("AND", "OR"):
+            if classes != [bool, bool]:
+                return instruction
+            result = Program.andor(name, *values)
+        elif name == "NOT":
+            if classes != [bool]:
+                return instruction
+            result = not values[0]
+        elif name == "CONCAT":
+            if classes != [str, str]:
+                return instruction
+            result = values[0] + values[1]
+        else:
+            if classes != [str]:
+                return instruction
+            result = len(values[0])
+
+        if name in ("JUMPIFEQ", "JUMPIFNEQ"):
+            if result == (name == "JUMPIFEQ"):
+                return self.make_instruction("JUMP", [args[0]], instruction.order)
+            return self.make_instruction("BREAK", [], instruction.order)    # never jumps, removed as a no-op later
+        return self.make_instruction("MOVE", [args[0], self.literal(result)], instruction.order)
+
+    def first_instruction_after(self, label):
+        # index of the first instruction that runs after jumping to the label
+        index = self.program.program_labels[label] + 1
+        instructions = self.program.program_instructions
+        while index < len(instructions) and instructions[index].name in self.NOPS:
+            index += 1
+        return index
+
+    def thread_jump(self, label:Argument):
+        visited = {label.literalValue}
+        instructions = self.program.program_instructions
+        while label.literalValue in self.program.program_labels:
+            index = self.first_instruction_after(label.literalValue)
+            if index >= len(instructions) or instructions[index].name != "JUMP":
+                return
+            target = instructions[index].args[0].literalValue
+            if target in visited:
+                return      # an endless loop of jumps, kept as it is
+            visited.add(target)
+            label.literalValue = target
+
+    def fuse(self, first:Instruction, second:Instruction):
+        if first.name in ("LT", "GT", "EQ") and second.name in ("JUMPIFEQ", "JUMPIFNEQ"):
+            var = first.args[0].variable
+            for result_arg, other in ((second.args[1], second.args[2]), (second.args[2], second.args[1])):
+                if (result_arg.type == TYPE_VAR and result_arg.variable.varname == var.varname
+                        and result_arg.variable.varframe == var.varframe and other.type == TYPE_BOOL):
+                    jump_when = other.literalValue == (second.name == "JUMPIFEQ")
+                    fused = Instruction(f"{first.name}+{second.name}", first.order)
+                    fused.args = first.args + [second.args[0]]
+                    fused.handler = self.program.instruction_compare_jump
+                    fused.operands = (var, first.args[1], first.args[2], first.name, None, jump_when)  # label index set by bind()
+                    return fused
+        if first.name == "PUSHS" and second.name == "POPS":
+            return self.make_instruction("MOVE", [second.args[0], first.args[0]], first.order)
+        return None
+
+    def compact(self):
+        # drops the no-ops and fuses the pairs, the labels are moved to the instruction that follows them
+        program = self.program
+        old_instructions = program.program_instructions
+        new_instructions = []
+        new_index = [0] * (len(old_instructions) + 1)
+        index = 0
+        while index < len(old_instructions):
+            instruction = old_instructions[index]
+            new_index[index] = len(new_instructions)
+            if instruction.name in self.NOPS:
+                index += 1
+                continue
+            fused = None
+            if self.superinstructions and index + 1 < len(old_instructions):
+                fused = self.fuse(instruction, old_instructions[index + 1])
+            if fused is not None:
+                new_index[index + 1] = len(new_instructions)
+                new_instructions.append(fused)
+                index += 2
+            else:
+                new_instructions.append(instruction)
+                index += 1
+        new_index[len(old_instructions)] = len(new_instructions)
+
+        # a jump sets the counter to the label index and the next instruction runs, hence the -1
+        for label, old_index in program.program_labels.items():
+            program.program_labels[label] = new_index[old_index] - 1
+        program.program_instructions = new_instructions
+
+
+class TypeInference:
+    # Dataflow analysis of the types the variables can hold (-O, after the Optimizer). The state of every basic block
+    # is a bit mask of the possible types per variable (GF slots first, then LF and TF slots), 0 means the variable
+    # holds no value there. The states are joined over the control-flow graph until they stop changing, then the
+    # instructions whose type checks can't fail are bound to the check-free handlers. A missing value still ends
+    # with 56 there, since the specialised handlers fetch their operands just like the checked ones.
+    # OTHER is a type@ or label@ literal where a symbol is expected, no check-free handler accepts it.
+    INT, BOOL, STRING, NIL_TYPE, OTHER = 1, 2, 4, 8, 16
+    ANY = 15
+    TYPE_BITS = {TYPE_INT: INT, TYPE_BOOL: BOOL, TYPE_STRING: STRING, TYPE_NIL: NIL_TYPE}
+    READ_RESULTS = {"int": INT | NIL_TYPE, "bool": BOOL | NIL_TYPE, "string": STRING | NIL_TYPE}
+    # type of the result of the instructions that store one into their first operand
+    RESULTS = {
+        "ADD": INT, "SUB": INT, "MUL": INT, "IDIV": INT, "STRI2INT": INT, "STRLEN": INT,
+        "LT": BOOL, "GT": BOOL, "EQ": BOOL, "AND": BOOL, "OR": BOOL, "NOT": BOOL,
+        "INT2CHAR": STRING, "CONCAT": STRING, "GETCHAR": STRING, "SETCHAR": STRING, "TYPE": STRING,
+        "POPS": ANY,
+    }
+    ARITHMETIC = {"ADD": operator.add, "SUB": operator.sub, "MUL": operator.mul}
+    COMPARISONS = {"LT": operator.lt, "GT": operator.gt, "EQ": operator.eq}
+    # the analysis keeps a state per block and variable, bigger programs are left as they are
+    MAX_STATE_SIZE = 1 << 22
+
+    def __init__(self, program:Program):
+        self.program = program
+        self.local_offset = len(program.global_slots)
+        self.variable_count = self.local_offset + 2 * len(program.local_slots)
+
+    def key(self, var:Variable):
+        if var.frame_index == 0:
+            return var.slot
+        return self.local_offset + (var.frame_index - 1) * len(self.program.local_slots) + var.slot
+
+    def label_target(self, label:Argument):
+        return self.program.program_labels[label.literalValue] + 1
+
+    def split_blocks(self):
+        instructions = self.program.program_instructions
+        leaders = {0}
+        for index in self.program.program_labels.values():
+            leaders.add(index + 1)
+        for index, instruction in enumerate(instructions):
+            if self.jump_label(instruction) is not None or instruction.name in ("RETURN", "EXIT"):
+                leaders.add(index + 1)
+        leaders = sorted(leader for leader in leaders if leader < len(instructions))
+        return leaders, leaders[1:] + [len(instructions)]
+
+    @staticmethod
+    def jump_label(instruction:Instruction):
+        if instruction.name in ("JUMP", "CALL", "JUMPIFEQ", "JUMPIFNEQ", "JUMPIFEQS", "JUMPIFNEQS"):
+            return instruction.args[0]
+        if "+" in instruction.name:
+            return instruction.args[-1]     # superinstruction, the label is the last argument
+        return None
+
+    def symbol_types(self, state, symb:Argument):
+        if symb.type == TYPE_VAR:
+            return state[self.key(symb.variable)]
+        return self.TYPE_BITS.get(symb.type, self.OTHER)
+
+    def transfer(self, state, instruction:Instruction):
+        name = instruction.name
+        local_count = len(self.program.local_slots)
+        lf = self.local_offset
+        tf = self.local_offset + local_count
+        if name == "CREATEFRAME":
+            state[tf:tf + local_count] = [0] * local_count
+        elif name == "PUSHFRAME":
+            state[lf:lf + local_count] = state[tf:tf + local_count]
+            state[tf:tf + local_count] = [0] * local_count
+        elif name == "POPFRAME":
+            # the local frame below is unknown here
+            state[tf:tf + local_count] = state[lf:lf + local_count]
+            state[lf:lf + local_count] = [self.ANY] * local_count
+        elif name == "DEFVAR":
+            state[self.key(instruction.args[0].variable)] = 0
+        elif name == "MOVE":
+            state[self.key(instruction.args[0].variable)] = self.symbol_types(state, instruction.args[1])
+        elif name == "READ":
+            state[self.key(instruction.args[0].variable)] = self.READ_RESULTS.get(instruction.args[1].literalValue, 0)
+        elif name.split("+")[0] in self.RESULTS and instruction.args[0].type == TYPE_VAR:
+            state[self.key(instruction.args[0].variable)] = self.RESULTS[name.split("+")[0]]
+
+    def successors(self, instruction:Instruction, index, state):
+        # (index of the next instruction, state) pairs, a call returns with nothing known about the variables
+        name = instruction.name
+        if name in ("RETURN", "EXIT"):
+            return []
+        label = self.jump_label(instruction)
+        if label is None:
+            return [(index + 1, state)]
+        target = self.label_target(label)
+        if name == "JUMP":
+            return [(target, state)]
+        if name == "CALL":
+            return [(index + 1, [self.ANY] * self.variable_count), (target, state)]
+        return [(index + 1, state), (target, state)]
+
+    def analyze(self, starts, ends):
+        instructions = self.program.program_instructions
+        block_of = {start: number for number, start in enumerate(starts)}
+        states = [None] * len(starts)
+        states[0] = [0] * self.variable_count
+        worklist = [0]
+        while worklist:
+            number = worklist.pop()
+            state = list(states[number])
+            for index in range(starts[number], ends[number]):
+                self.transfer(state, instructions[index])
+            last = ends[number] - 1
+            for successor, successor_state in self.successors(instructions[last], last, state):
+                if successor >= len(instructions):
+                    continue
+                successor_number = block_of[successor]
+                current = states[successor_number]
+                if current is None:
+                    states[successor_number] = list(successor_state)
+                else:
+                    joined = [old | new for old, new in zip(current, successor_state)]
+                    if joined == current:
+                        continue
+                    states[successor_number] = joined
+                worklist.append(successor_number)
+        return states
+
+    def specialize(self):
+        if not self.program.program_instructions:
+            return
+        starts, ends = self.split_blocks()
+        if len(starts) * self.variable_count > self.MAX_STATE_SIZE:
+            return
+        states = self.analyze(starts, ends)
+        instructions = self.program.program_instructions
+        for number, state in enumerate(states):
+            if state is None:
+                continue    # never reached
+            state = list(state)
+            for index in range(starts[number], ends[number]):
+                self.select_handler(instructions[index], state)
+                self.transfer(state, instructions[index])
+
+    def select_handler(self, instruction:Instruction, state):
+        # rebinds the instruction when the types of its operands are proven, the masks are single types (or 0)
+        program = self.program
+        name = instruction.name
+        operands = instruction.operands
+        types = [self.symbol_types(state, arg) for arg in instruction.args]
+
+        def only(mask, allowed):
+            return mask & ~allowed == 0
+
+        def same_type(first, second):
+            # both operands are of one type (0 is no value, fetching it ends with 56 before any comparison)
+            return (first | second) in (0, self.INT, self.BOOL, self.STRING, self.NIL_TYPE)
+
+        if name in self.ARITHMETIC and only(types[1], self.INT) and only(types[2], self.INT):
+            instruction.handler = program.instruction_arithmetic_int
+            instruction.operands = operands[:3] + (self.ARITHMETIC[name],)
+        elif name == "IDIV" and only(types[1], self.INT) and only(types[2], self.INT):
+            instruction.handler = program.instruction_idiv_int
+            instruction.operands = operands[:3]
+        elif name in ("LT", "GT") and same_type(types[1], types[2]) and only(types[1] | types[2], self.INT | self.BOOL | self.STRING):
+            instruction.handler = program.instruction_operation_typed
+            instruction.operands = operands[:3] + (self.COMPARISONS[name],)
+        elif name == "EQ" and same_type(types[1], types[2]):
+            instruction.handler = program.instruction_operation_typed
+            instruction.operands = operands[:3] + (operator.eq,)
+        elif name in ("AND", "OR") and only(types[1], self.BOOL) and only(types[2], self.BOOL):
+            instruction.handler = program.instruction_operation_typed
+            instruction.operands = operands[:3] + (operator.and_ if name == "AND" else operator.or_,)
+        elif name == "NOT" and only(types[1], self.BOOL):
+            instruction.handler = program.instruction_not_bool
+        elif name == "CONCAT" and only(types[1], self.STRING) and only(types[2], self.STRING):
+            instruction.handler = program.instruction_concat_string
+        elif name == "STRLEN" and only(types[1], self.STRING):
+            instruction.handler = program.instruction_strlen_string
+        elif name == "GETCHAR" and only(types[1], self.STRING) and only(types[2], self.INT):
+            instruction.handler = program.instruction_getchar_typed
+        elif name in ("JUMPIFEQ", "JUMPIFNEQ") and same_type(types[1], types[2]):
+            instruction.handler = program.instruction_jumpif_typed
+            instruction.operands = operands + (name == "JUMPIFEQ",)
+        elif "+" in name:
+            # the fused comparison: var, symb1, symb2, op, label, jump_when
+            op = operands[3]
+            if same_type(types[1], types[2]) and (op == "EQ" or only(types[1] | types[2], self.INT | self.BOOL | self.STRING)):
+                instruction.handler = program.instruction_compare_jump_typed
+                instruction.operands = operands[:3] + (self.COMPARISONS[op],) + operands[4:]
+
+
+class InterpreterError(Exception):
+    # An error ending the interpretation, code is the exit code of IPPcode22. The subclasses group the codes,
+    # error_exit() raises the one of its code.
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+class UsageError(InterpreterError):         # 10
+    pass
+
+class FileAccessError(InterpreterError):    # 11, 12
+    pass
+
+class SourceError(InterpreterError):        # 31, 32
+    pass
+
+class SemanticError(InterpreterError):      # 52
+    pass
+
+class ExecutionError(InterpreterError):     # 53-58
+    pass
+
+class LimitExceeded(InterpreterError):      # 60-62
+    pass
+
+class InternalError(InterpreterError):      # 99
+    pass
+
+ERROR_TYPES = {10: UsageError, 11: FileAccessError, 12: FileAccessError, 31: SourceError, 32: SourceError, 52: SemanticError,
+               **{code: ExecutionError for code in range(53, 59)}, **{code: LimitExceeded for code in range(60, 63)}}
+
+class ProgramExit(Exception):
+    # raised by EXIT, the program ended with the code
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+def error_exit(err_code, err_msg):
+    raise ERROR_TYPES.get(err_code, InternalError)(err_code, err_msg)
+
+class XMLStructureError(Exception):
+    pass
+
+def check_program_element(root):
+    if root.tag != "program":
+        return "Missing a program tag in the xml header."
+    if "language" not in root.attrib:
+        return "Missing language attribute completely."
+    if root.attrib["language"].lower() != "ippcode22":
+        return "Wrong language attribute."
+    return None
+
+def parse_instruction_element(element):
+    if element.tag != "instruction":
+        raise XMLStructureError("Wrong format of XML - instruction tag missing.")
+    if "opcode" not in element.attrib or "order" not in element.attrib:
+        raise XMLStructureError("Missing XML attribute.")
     try:
-        parent[:] = sorted(parent, key=lambda child: int(child.get(attr)))
-        for child in parent:
-            child[:] = sorted(child, key=lambda child: (child.tag))
-    except:
-        error_exit(32, "Wrong XML structure.")
+        order = int(element.attrib["order"])
+    except ValueError:
+        raise XMLStructureError("Wrong XML structure.")
+    if order <= 0:
+        raise XMLStructureError("Error: incorrect order value of the instruction.")
+
+    args = {}
+    for arg in element:
+        if arg.tag not in ("arg1", "arg2", "arg3") or arg.tag in args:
+            raise XMLStructureError("Wrong format of XML - wrong arg tag.")
+        if "type" not in arg.attrib:
+            raise XMLStructureError("Missing XML attribute.")
+        args[arg.tag] = arg
+
+    instruction = Instruction(element.attrib["opcode"], order)
+    for arg_num in range(1, len(args) + 1):
+        if f"arg{arg_num}" not in args:
+            raise XMLStructureError("Wrong format of XML - wrong arg tag.")
+        arg = args[f"arg{arg_num}"]
+        if arg.attrib["type"] == "var":
+            frame, _, name = (arg.text or "").partition("@")
+            if frame not in ("GF", "LF", "TF") or not name:
+                raise XMLStructureError("Error: wrong variable definition.")
+            instruction.add_var_argument(name, frame)
+        else:
+            instruction.add_argument(*parse_literal(arg.attrib["type"], arg.text))
+    return order, instruction
+
+def parse_literal(type_name, text):
+    # converts the literal to its type tag and native value
+    if type_name not in TYPE_CODES or type_name == "var":
+        raise XMLStructureError(f"Error: unknown argument type {type_name}.")
+    if type_name == "int":
+        try:
+            return TYPE_INT, int(text)
+        except (TypeError, ValueError):
+            raise XMLStructureError(f"Error: incorrect int literal {text}.")
+    if type_name == "bool":
+        if text not in ("true", "false"):
+            raise XMLStructureError(f"Error: incorrect bool literal {text}.")
+        return TYPE_BOOL, text == "true"
+    if type_name == "nil":
+        if text != "nil":
+            raise XMLStructureError(f"Error: incorrect nil literal {text}.")
+        return TYPE_NIL, NIL
+    if type_name == "type" and text not in ("int", "string", "bool"):
+        raise XMLStructureError(f"Error: incorrect type literal {text}.")
+    if type_name == "string":
+        return TYPE_STRING, Program.decode_escape_sequences(text) if text is not None else ""
+    return TYPE_CODES[type_name], text if text is not None else ""
 
 def dprint(string):
     print(f"<{string}>    ", end=" ")
 
 
 
+################# API #####################################################
+
+class Result:
+    # outcome of run(), output is the text the program wrote when no stdout was given
+    def __init__(self, exit_code:int, output:str=None):
+        self.exit_code = exit_code
+        self.output = output
+
+    def __repr__(self):
+        return f"Result(exit_code={self.exit_code}, output={self.output!r})"
+
+def open_source(source):
+    # a path, the XML as bytes or a binary file
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+def open_input(user_input=None, input_file=None):
+    # the input itself as str or bytes, a binary file or None for no input, or the path of the input file
+    if input_file is not None:
+        if user_input is not None:
+            error_exit(10, "Only one of input and input_file can be given.")
+        try:
+            return InputReader.open_file(input_file)
+        except OSError:
+            error_exit(11, "Input file not found.")
+    if user_input is None:
+        return InputReader(io.BytesIO(b""))
+    if isinstance(user_input, str):
+        return InputReader(io.BytesIO(user_input.encode("utf-8")))
+    if isinstance(user_input, (bytes, bytearray)):
+        return InputReader(io.BytesIO(user_input))
+    return InputReader(user_input)
+
+def load(source, optimize:bool=False, legacy_dispatch:bool=False, cache_dir=None) -> Program:
+    # loads the program once, run() can then run it any number of times
+    program = Program()
+    # collecting garbage while the objects of the program are created only slows the loading down, a caller that
+    # has disabled the collection keeps it disabled
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        if cache_dir:
+            ProgramCache(cache_dir).load_program(program, open_source(source))
+        else:
+            program.save_instructions(open_source(source))
+    finally:
+        if gc_enabled:
+            gc.enable()
+    if optimize:
+        # the legacy dispatch only knows the opcodes of the source, so it can't run superinstructions
+        Optimizer(program, superinstructions=not legacy_dispatch).optimize()
+        if not legacy_dispatch:
+            TypeInference(program).specialize()
+    return program
+
+def run(source, input=None, stdout=None, optimize:bool=False, max_steps:int=None, max_seconds:float=None,
+        max_memory:int=None, input_file=None, monitors=()) -> Result:
+    # Interprets a program in this process. The source is a Program from load() (reset and run again without parsing)
+    # or anything load() takes. The input is str or bytes with the input itself or a binary file, input_file is the
+    # path of an input file instead. The output goes to the stdout text stream, or into Result.output without it.
+    # EXIT gives the exit code of the Result, the errors are raised as InterpreterError with the exit code of IPPcode22.
+    # The monitors are called between the slices of interpret_in_slices() with the Limits (see Limits.advance()).
+    program = source if isinstance(source, Program) else load(source, optimize)
+    program.reset()
+    captured = io.StringIO() if stdout is None else None
+    program.output = OutputBuffer(captured if captured is not None else stdout)
+    program.user_input = open_input(input, input_file)
+    monitors = list(monitors)
+    if (max_steps, max_seconds, max_memory) != (None, None, None):
+        monitors.append(Limits(program, max_steps, max_seconds, max_memory))
+    try:
+        exit_code = program.execute(monitors=monitors)
+    finally:
+        program.output.flush()
+        program.user_input.close()
+    return Result(exit_code, captured.getvalue() if captured is not None else None)
+
+
 ################# main ####################################################
 
-if __name__ == "__main__":
+def debugger_commands(input_file):
+    # the commands of the debugger come from the terminal, or from stdin when it isn't the input of the program
+    try:
+        return open("/dev/tty", "r")
+    except OSError:
+        return sys.stdin if input_file is not None else None
+
+def main(argv=None):
     parser = ArgumentParser()
     parser.add_argument('--source', metavar='<source file>')
     parser.add_argument('--input', metavar='<input file>')
-
-    args = parser.parse_args()
+    parser.add_argument('--legacy-dispatch', action='store_true', help='dispatch instructions through the if/elif chain')
+    parser.add_argument('--compile-to', metavar='<output file>', help='translate the program into a Python module instead of interpreting it')
+    parser.add_argument('--output', metavar='<output file>', help='write the program output into a file instead of stdout')
+    parser.add_argument('-O', dest='optimize', action='store_true', help='run the peephole optimizer before interpreting')
+    parser.add_argument('--flush-threshold', metavar='<chars>', type=int, default=1 << 16, help='size of the output buffer (0 flushes every WRITE)')
+    parser.add_argument('--cache-dir', metavar='<directory>', help='keep the loaded programs in the directory and reuse them while the source is the same')
+    parser.add_argument('--profile', metavar='<profile file>', help='sample the call stack and write it as folded stacks into the file')
+    parser.add_argument('--profile-interval', metavar='<ms>', type=float, default=1.0, help='sampling interval of --profile in milliseconds of CPU time')
+    parser.add_argument('--checkpoint-every', metavar='<instructions>', type=int, default=0, help='save the state into the checkpoint file every N executed instructions')
+    parser.add_argument('--checkpoint-file', metavar='<file>', help='file with the saved state of the interpretation')
+    parser.add_argument('--resume', action='store_true', help='continue from the state saved in the checkpoint file')
+    parser.add_argument('--max-steps', metavar='<instructions>', type=int, help='end with exit code 60 after executing N instructions')
+    parser.add_argument('--max-seconds', metavar='<seconds>', type=float, help='end with exit code 61 after running for the given time')
+    parser.add_argument('--max-memory', metavar='<MiB>', type=float, help='end with exit code 62 when the program data grows over the size')
+    parser.add_argument('--debug', action='store_true', help='run in the debug mode, BREAK and DPRINT write to stderr')
+    parser.add_argument('--break', dest='breakpoints', metavar='<order|label>', action='append', default=[], help='stop before the instruction with the order or after the label (debug mode)')
+    parser.add_argument('--watch', dest='watches', metavar='<var>', action='append', default=[], help='stop when the variable (GF@x) changes (debug mode)')
+    parser.add_argument('--step', action='store_true', help='stop before every instruction (debug mode)')
+    parser.add_argument('--trace', metavar='<trace file>', help='record the last executed instructions and write them into the file on an error')
+    parser.add_argument('--trace-size', metavar='<entries>', type=int, default=1 << 16, help='number of instructions kept by --trace')
+    parser.add_argument('--stats', metavar='<stats file>', help='write execution statistics into the file')
+    for group, group_help in (("insts", "executed instructions per opcode"), ("hot", "the most executed instructions"),
+                              ("vars", "peak count of initialised variables"), ("stack", "peak data and frame stack depth")):
+        parser.add_argument(f'--{group}', dest='stats_groups', action='append_const', const=group, help=f'statistics: {group_help}')
+
+    args = parser.parse_args(argv)
     # at least one argument from --source | --input is required
     if not (args.source or args.input):
         error_exit(10, "Missing at least one of the two arguments: --source, --input")
-
-    xml = get_source_xml(args.source)
-    sort_xml(xml.getroot(), "order")
-    check_if_xml_valid(xml)
-
-    program = Program()
-    program.search_labels(xml)
-    program.save_instructions(xml)
+    if args.stats_groups and not args.stats:
+        error_exit(10, "Statistics groups given without --stats.")
+    if (args.checkpoint_every > 0 or args.resume) != bool(args.checkpoint_file) or args.checkpoint_every < 0:
+        error_exit(10, "--checkpoint-file goes together with --checkpoint-every or --resume.")
+    limits = (args.max_steps, args.max_seconds, args.max_memory)
+    if any(limit is not None and limit <= 0 for limit in limits):
+        error_exit(10, "Limits have to be positive.")
+    if (args.checkpoint_every or limits != (None, None, None)) and args.stats:
+        error_exit(10, "--checkpoint-every and the limits can't be combined with --stats.")
+    debug = args.debug or args.breakpoints or args.watches or args.step
+    if args.trace and (debug or args.stats or args.checkpoint_every or limits != (None, None, None)):
+        error_exit(10, "--trace can't be combined with the debug mode, --stats, --checkpoint-every and the limits.")
+    if args.trace_size <= 0:
+        error_exit(10, "--trace-size has to be positive.")
+    if debug and (args.stats or args.checkpoint_every or limits != (None, None, None)):
+        error_exit(10, "The debug mode can't be combined with --stats, --checkpoint-every and the limits.")
+    if debug and args.optimize:
+        # the optimizer removes BREAK, DPRINT and LABEL and merges instructions, the breakpoints would be lost
+        error_exit(10, "The debug mode can't be combined with -O.")
+
+    source = args.source if args.source is not None else sys.stdin.buffer
+    if args.compile_to:
+        program = load(source, cache_dir=args.cache_dir)
+        try:
+            compile_program(program, args.compile_to)
+        except CompileError as error:
+            error_exit(error.code, error.message)
+        return 0
+    program = load(source, args.optimize, args.legacy_dispatch, args.cache_dir)
+    # the loaded objects live until the end, the collector doesn't need to go through them again
+    gc.freeze()
+    checkpoint = Checkpoint(program, args.checkpoint_file, args.checkpoint_every) if args.checkpoint_file else None
+    state = checkpoint.read() if args.resume else None
     program.fetch_user_input(args.input)
-    program.interpret()
+    if args.output:
+        program.redirect_output(args.output, args.flush_threshold, state["output_size"] if state is not None else None)
+    else:
+        program.output.flush_threshold = args.flush_threshold
+    if state is not None:
+        checkpoint.restore(program, state)
+    stats = Statistics(args.stats_groups) if args.stats else None
+    monitors = []
+    if args.checkpoint_every:
+        monitors.append(checkpoint)
+    if limits != (None, None, None):
+        max_memory = int(args.max_memory * (1 << 20)) if args.max_memory is not None else None
+        monitors.append(Limits(program, args.max_steps, args.max_seconds, max_memory))
+    debugger = None
+    if debug:
+        debugger = Debugger(program, args.breakpoints, args.watches, args.step, debugger_commands(args.input))
+    trace = TraceRecorder(program, args.trace, args.trace_size) if args.trace else None
+    profiler = Profiler(program, args.profile_interval / 1000) if args.profile else None
+    if profiler is not None:
+        profiler.start()
+    try:
+        return program.execute(args.legacy_dispatch, stats, monitors, debugger, trace)
+    finally:
+        if checkpoint is not None:
+            checkpoint.wait()
+        # also reached by the errors
+        program.output.close()
+        if stats is not None:
+            stats.write(args.stats)
+        if profiler is not None:
+            profiler.write(args.profile)
+
 
+if __name__ == "__main__":
+    try:
+        exit(main())
+    except InterpreterError as error:
+        sys.stderr.write(error.message)
+        exit(error.code)
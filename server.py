@@ -0,0 +1,189 @@
+import sys
+import os
+import io
+import signal
+import asyncio
+import hashlib
+import itertools
+import traceback
+from argparse import ArgumentParser
+from multiprocessing import RawArray
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import interpret
+from client import REQUEST, RESPONSE, default_socket_path
+
+# Interpreter server: listens on a Unix socket and runs the jobs of client.py (the source XML and the input of one run)
+# on a pool of worker processes, which have the interpreter imported and warmed up before the first job comes, so a run
+# costs neither the Python startup nor the imports. The connections are handled by asyncio, every connection is a
+# sequence of jobs answered in order. Like in batch.py, the jobs run through interpret.run(), with the limits of the
+# server. A job whose client disconnects before its response is cancelled.
+
+
+DEFAULT_MAX_SECONDS = 60.0
+# ids of the cancelled jobs shared with the workers, the id of a job is in the slot of its id modulo the size, a running
+# job checks its slot between the slices (a job overwritten by later cancellations ends at its limits)
+CANCELLED_SLOTS = 64
+
+# state of a worker process, set up once by init_worker()
+worker_options = {}
+loaded_programs = {}
+cancelled_jobs = None
+
+def init_worker(options, cancelled):
+    global cancelled_jobs
+    worker_options.update(options)
+    cancelled_jobs = cancelled
+
+def warm_up():
+    # run a small program so that everything on the way is imported and compiled
+    run_job(b'<?xml version="1.0" encoding="UTF-8"?><program language="IPPcode22">'
+            b'<instruction order="1" opcode="WRITE"><arg1 type="int">1</arg1></instruction></program>', b"")
+    return os.getpid()
+
+def load_program(source):
+    # a source sent again (by its hash) is created from the serialized form, without parsing the XML
+    program = interpret.Program()
+    key = hashlib.sha256(source).digest()
+    if key in loaded_programs:
+        program.load_serialized(loaded_programs[key])
+    else:
+        program.save_instructions(io.BytesIO(source))
+        if len(loaded_programs) >= worker_options.get("max_programs", 256):
+            loaded_programs.pop(next(iter(loaded_programs)))
+        loaded_programs[key] = program.serialize()
+    if worker_options.get("optimize"):
+        interpret.Optimizer(program).optimize()
+        interpret.TypeInference(program).specialize()
+    return program
+
+class JobCancelled(Exception):
+    pass
+
+class Cancellation:
+    # monitor of the run of a job, ends it once the server has cancelled it
+    remaining = interpret.Limits.CHECK_INTERVAL
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def advance(self, program, steps):
+        if cancelled_jobs[self.job_id % CANCELLED_SLOTS] == self.job_id:
+            raise JobCancelled()
+
+def run_job(source, user_input, job_id=None):
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    saved_stderr = sys.stderr
+    sys.stderr = stderr
+    monitors = [Cancellation(job_id)] if job_id is not None else []
+    try:
+        exit_code = interpret.run(load_program(source), user_input, stdout, max_steps=worker_options.get("max_steps"),
+                                  max_seconds=worker_options.get("max_seconds"), monitors=monitors).exit_code
+    except JobCancelled:
+        return None
+    except interpret.InterpreterError as error:
+        exit_code = error.code
+        stderr.write(error.message)
+    except Exception:
+        exit_code = 99
+        stderr.write(traceback.format_exc())
+    finally:
+        sys.stderr = saved_stderr
+    return exit_code, stdout.getvalue().encode("utf-8"), stderr.getvalue().encode("utf-8")
+
+
+class Server:
+    def __init__(self, socket_path, jobs=None, options=None):
+        self.socket_path = socket_path
+        self.jobs = jobs or os.cpu_count() or 1
+        self.options = options or {}
+        self.executor = None
+        self.job_ids = itertools.count(1)
+        self.cancelled = RawArray("q", CANCELLED_SLOTS)
+
+    def start_workers(self):
+        self.executor = ProcessPoolExecutor(max_workers=self.jobs, initializer=init_worker, initargs=(self.options, self.cancelled))
+        # the pool starts its processes lazily, a warm-up per worker starts all of them now
+        for future in [self.executor.submit(warm_up) for _ in range(self.jobs)]:
+            future.result()
+
+    async def run(self, job_id, source, user_input):
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, run_job, source, user_input, job_id)
+        except BrokenProcessPool:
+            # a worker died (killed or out of memory), the job fails and the pool is started again
+            self.executor.shutdown(wait=False)
+            await loop.run_in_executor(None, self.start_workers)
+            return 99, b"", b"The worker running the program has died."
+
+    def cancel(self, job_id, job):
+        # a job still waiting in the pool is dropped, a running one ends at the end of its slice
+        self.cancelled[job_id % CANCELLED_SLOTS] = job_id
+        job.cancel()
+
+    async def handle_connection(self, reader, writer):
+        # the next request is read while a job runs, so that the client closing the connection is noticed
+        next_header = asyncio.ensure_future(reader.readexactly(REQUEST.size))
+        try:
+            while True:
+                try:
+                    header = await next_header
+                except asyncio.IncompleteReadError:
+                    break
+                source_size, input_size = REQUEST.unpack(header)
+                source = await reader.readexactly(source_size)
+                user_input = await reader.readexactly(input_size)
+                next_header = asyncio.ensure_future(reader.readexactly(REQUEST.size))
+                job_id = next(self.job_ids)
+                job = asyncio.ensure_future(self.run(job_id, source, user_input))
+                await asyncio.wait((job, next_header), return_when=asyncio.FIRST_COMPLETED)
+                if not job.done() and next_header.exception() is not None:
+                    self.cancel(job_id, job)
+                    break
+                exit_code, stdout, stderr = await job
+                writer.write(RESPONSE.pack(exit_code, len(stdout), len(stderr)))
+                writer.write(stdout)
+                writer.write(stderr)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            next_header.cancel()
+            writer.close()
+
+    async def serve(self):
+        self.start_workers()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self.handle_connection, path=self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        # SIGINT and SIGTERM stop the server, a background process started by a shell ignores SIGINT
+        stopped = asyncio.get_running_loop().create_future()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            asyncio.get_running_loop().add_signal_handler(signum, lambda: stopped.done() or stopped.set_result(None))
+        try:
+            async with server:
+                await stopped
+        finally:
+            os.unlink(self.socket_path)
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Serves IPPcode22 runs of client.py from a pool of warm interpreter processes.")
+    parser.add_argument('--socket', metavar='<path>', default=default_socket_path(), help='path of the Unix socket (IPPCODE22_SOCKET by default)')
+    parser.add_argument('--jobs', '-j', metavar='<count>', type=int, default=None, help='number of worker processes (CPU count by default)')
+    parser.add_argument('-O', dest='optimize', action='store_true', help='run the optimizer on every program')
+    parser.add_argument('--max-steps', metavar='<instructions>', type=int, help='end a job with exit code 60 after executing N instructions')
+    parser.add_argument('--max-seconds', metavar='<seconds>', type=float, default=DEFAULT_MAX_SECONDS,
+                        help=f'end a job with exit code 61 after running for the given time ({DEFAULT_MAX_SECONDS:g} s by default)')
+    args = parser.parse_args()
+    if any(limit is not None and limit <= 0 for limit in (args.max_steps, args.max_seconds)):
+        sys.stderr.write("Limits have to be positive.")
+        exit(10)
+
+    server = Server(args.socket, args.jobs, {"optimize": args.optimize, "max_steps": args.max_steps, "max_seconds": args.max_seconds})
+    asyncio.run(server.serve())
@@ -0,0 +1,31 @@
+import gc
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import interpret
+from bench import program_xml
+
+
+class LoadTest(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(gc.enable if gc.isenabled() else gc.disable)
+
+    def test_gc_state_kept(self):
+        for enabled in (True, False):
+            with self.subTest(enabled=enabled):
+                if enabled:
+                    gc.enable()
+                else:
+                    gc.disable()
+                interpret.load(program_xml([("WRITE", "int@1")]))
+                self.assertEqual(gc.isenabled(), enabled)
+                with self.assertRaises(interpret.SourceError):
+                    interpret.load(b"<program")
+                self.assertEqual(gc.isenabled(), enabled)
+
+
+if __name__ == "__main__":
+    unittest.main()
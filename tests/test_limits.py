@@ -0,0 +1,35 @@
+import os
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import interpret
+from bench import program_xml
+
+MAX_MEMORY = 20 << 20
+
+# programs that grow without an end, the memory they are stopped at has to stay close to the limit
+GROWING = {
+    "pushs": [("LABEL", "label@l"), ("PUSHS", "string@abcdefgh"), ("JUMP", "label@l")],
+    "pushs_slow": [("DEFVAR", "GF@i"), ("MOVE", "GF@i", "int@0"), ("LABEL", "label@l"), ("ADD", "GF@i", "GF@i", "int@1"),
+                   ("ADD", "GF@i", "GF@i", "int@1"), ("ADD", "GF@i", "GF@i", "int@1"), ("PUSHS", "GF@i"), ("JUMP", "label@l")],
+    "concat": [("DEFVAR", "GF@s"), ("MOVE", "GF@s", "string@a"), ("LABEL", "label@l"),
+               ("CONCAT", "GF@s", "GF@s", "string@abcdefgh"), ("JUMP", "label@l")],
+}
+
+
+class MemoryLimitTest(unittest.TestCase):
+    def test_stopped_near_limit(self):
+        for name, code in GROWING.items():
+            with self.subTest(name):
+                with self.assertRaises(interpret.LimitExceeded) as context:
+                    interpret.run(program_xml(code), max_memory=MAX_MEMORY)
+                self.assertEqual(context.exception.code, 62)
+                used = int(re.search(r"\((\d+) bytes used\)", context.exception.message).group(1))
+                self.assertLess(used, MAX_MEMORY * 1.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
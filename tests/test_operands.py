@@ -0,0 +1,58 @@
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import interpret
+from bench import program_xml
+
+# type@ and label@ literals hold a str, but they are no strings: they are equal only to the same literal of the same type
+# and every other use where the type of a symbol is checked ends with 53
+PROLOGUE = [("DEFVAR", "GF@x"), ("DEFVAR", "GF@s"), ("MOVE", "GF@s", "string@int")]
+TYPE_LITERALS = {
+    "eq_string":      ([("EQ", "GF@x", "string@int", "type@int")], 53, ""),
+    "eq_var":         ([("EQ", "GF@x", "GF@s", "type@int")], 53, ""),
+    "eq_same":        ([("EQ", "GF@x", "type@int", "type@int"), ("WRITE", "GF@x")], 0, "true"),
+    "eq_type_label":  ([("EQ", "GF@x", "type@int", "label@int")], 53, ""),
+    "eq_nil":         ([("EQ", "GF@x", "nil@nil", "label@e"), ("WRITE", "GF@x")], 0, "false"),
+    "lt_string":      ([("LT", "GF@x", "type@int", "string@int")], 53, ""),
+    "lt_same":        ([("LT", "GF@x", "label@e", "label@e"), ("WRITE", "GF@x")], 0, "false"),
+    "jumpifeq_var":   ([("JUMPIFEQ", "label@e", "GF@s", "type@int"), ("LABEL", "label@e")], 53, ""),
+    "jumpifneq_var":  ([("JUMPIFNEQ", "label@e", "type@int", "GF@s"), ("LABEL", "label@e")], 53, ""),
+    "and_label":      ([("AND", "GF@x", "label@e", "bool@true"), ("LABEL", "label@e")], 53, ""),
+    "concat_type":    ([("CONCAT", "GF@x", "string@a", "type@int")], 53, ""),
+    "concat_label":   ([("CONCAT", "GF@x", "label@e", "GF@s"), ("LABEL", "label@e")], 53, ""),
+    "concat_self":    ([("CONCAT", "GF@s", "GF@s", "type@int")], 53, ""),
+    "strlen_label":   ([("STRLEN", "GF@x", "label@foo"), ("LABEL", "label@foo")], 53, ""),
+    "getchar_type":   ([("GETCHAR", "GF@x", "type@int", "int@1")], 53, ""),
+    "stri2int_type":  ([("STRI2INT", "GF@x", "type@int", "int@0")], 53, ""),
+    "stri2int_pos":   ([("STRI2INT", "GF@x", "GF@s", "type@int")], 53, ""),
+}
+
+
+def run(code, optimize):
+    stdout = io.StringIO()
+    try:
+        exit_code = interpret.run(program_xml(PROLOGUE + code), stdout=stdout, optimize=optimize).exit_code
+    except interpret.InterpreterError as error:
+        exit_code = error.code
+    return exit_code, stdout.getvalue()
+
+
+class TypeLiteralTest(unittest.TestCase):
+    def check(self, optimize):
+        for name, (code, exit_code, output) in TYPE_LITERALS.items():
+            with self.subTest(name):
+                self.assertEqual(run(code, optimize), (exit_code, output))
+
+    def test_checked(self):
+        self.check(optimize=False)
+
+    def test_optimized(self):
+        self.check(optimize=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
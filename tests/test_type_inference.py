@@ -0,0 +1,41 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import interpret
+from bench import program_xml
+
+# Programs whose checked handlers end with 53, -O has to end them the same way instead of picking a check-free handler.
+# A type@ or label@ literal where a symbol is expected is never of a proven type.
+WRONG_LITERALS = {
+    "add_type": [("DEFVAR", "GF@x"), ("ADD", "GF@x", "type@int", "int@1")],
+    "getchar_type": [("DEFVAR", "GF@x"), ("GETCHAR", "GF@x", "string@abc", "type@int")],
+    "jumpifeq_type": [("JUMPIFEQ", "label@e", "type@int", "int@1"), ("LABEL", "label@e"), ("WRITE", "string@x")],
+    "eq_label": [("DEFVAR", "GF@b"), ("EQ", "GF@b", "label@e", "int@1"), ("LABEL", "label@e"), ("WRITE", "GF@b")],
+    "not_type": [("DEFVAR", "GF@b"), ("NOT", "GF@b", "type@int"), ("WRITE", "GF@b")],
+}
+
+
+def exit_code(code, optimize):
+    try:
+        return interpret.run(program_xml(code), optimize=optimize).exit_code
+    except interpret.InterpreterError as error:
+        return error.code
+
+
+class WrongLiteralTest(unittest.TestCase):
+    def test_checked(self):
+        for name, code in WRONG_LITERALS.items():
+            with self.subTest(name):
+                self.assertEqual(exit_code(code, optimize=False), 53)
+
+    def test_optimized(self):
+        for name, code in WRONG_LITERALS.items():
+            with self.subTest(name):
+                self.assertEqual(exit_code(code, optimize=True), 53)
+
+
+if __name__ == "__main__":
+    unittest.main()
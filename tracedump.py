@@ -0,0 +1,76 @@
+import sys
+from argparse import ArgumentParser
+
+import interpret
+
+# Decoder of the trace files written by interpret.py --trace: renders the recorded instructions against the source,
+# which is loaded the same way as by the traced run (-O has to match, the trace stores the hash of the loaded program).
+
+RESULT_NAMES = {interpret.TraceRecorder.PENDING: "failed", interpret.TraceRecorder.NO_RESULT: ""}
+
+def format_argument(arg:interpret.Argument):
+    if arg.type == interpret.TYPE_VAR:
+        return repr(arg.variable)
+    if arg.type == interpret.TYPE_NIL:
+        return "nil@nil"
+    if arg.type == interpret.TYPE_BOOL:
+        return f"bool@{'true' if arg.literalValue else 'false'}"
+    if arg.type == interpret.TYPE_STRING:
+        # the escapes of IPPcode22, so that the argument stays on one line
+        text = "".join(f"\\{ord(char):03d}" if ord(char) <= 32 or char in "#\\" else char for char in arg.literalValue)
+        return f"string@{text}"
+    return f"{arg.type_name}@{arg.literalValue}"
+
+def format_instruction(instruction:interpret.Instruction):
+    return " ".join([instruction.name, *(format_argument(arg) for arg in instruction.args)])
+
+def render(program, steps, entries):
+    first_step = steps - len(entries) + 1
+    lines = [f"{'step':>12} {'order':>7}  {'instruction':<48} result"]
+    label = None
+    for step, (index, name, result) in enumerate(entries, first_step):
+        location = program.location(index).rpartition(" in ")[2]
+        if location != label:
+            lines.append(f"{location}:")
+            label = location
+        instruction = program.program_instructions[index]
+        result_name = RESULT_NAMES.get(result, interpret.TYPE_NAMES[result] if result < len(interpret.TYPE_NAMES) else "?")
+        lines.append(f"{step:>12} {instruction.order:>7}  {format_instruction(instruction):<48} {result_name}")
+    return lines
+
+def main(argv=None):
+    parser = ArgumentParser(description="Renders a trace of interpret.py --trace against the source of the program.")
+    parser.add_argument('trace', metavar='<trace file>')
+    parser.add_argument('--source', metavar='<source file>', required=True, help='source of the traced program')
+    parser.add_argument('-O', dest='optimize', action='store_true', help='the traced run used -O')
+    parser.add_argument('--legacy-dispatch', action='store_true', help='the traced run used --legacy-dispatch (matters with -O)')
+    parser.add_argument('--last', metavar='<count>', type=int, default=None, help='render only the last instructions')
+    args = parser.parse_args(argv)
+
+    try:
+        steps, code, message, fingerprint, entries = interpret.TraceRecorder.read(args.trace)
+    except (OSError, ValueError, UnicodeDecodeError, interpret.struct.error):
+        interpret.error_exit(11, "Trace file can't be read.")
+    program = interpret.load(args.source, args.optimize, args.legacy_dispatch)
+    if interpret.TraceRecorder.fingerprint(program) != fingerprint:
+        interpret.error_exit(11, "The trace belongs to a different program (or the -O option differs).")
+    # the opcodes are stored too, they have to agree with the source
+    for index, name, _ in entries:
+        if index >= len(program.program_instructions) or program.program_instructions[index].name != name:
+            interpret.error_exit(11, "The trace doesn't match the program.")
+
+    if args.last is not None:
+        entries = entries[-args.last:] if args.last > 0 else []
+    print(f"exit code {code}: {message.strip()}")
+    print(f"{steps} instructions executed, the last {len(entries)} shown")
+    for line in render(program, steps, entries):
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        exit(main())
+    except interpret.InterpreterError as error:
+        sys.stderr.write(error.message)
+        exit(error.code)
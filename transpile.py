@@ -0,0 +1,419 @@
+# Ahead-of-time translation of a loaded Program into a standalone Python module (interpret.py --compile-to).
+# The instruction list is split into basic blocks, every block becomes a function that returns the next block
+# to run and the generated main() trampolines through them. Values are held as native Python objects
+# (int, bool, str and the NIL singleton), frames are plain dictionaries and the type checks are inlined.
+
+
+class CompileError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+RUNTIME = r'''import sys
+import re
+from argparse import ArgumentParser
+
+
+class _Nil:
+    def __repr__(self):
+        return "nil"
+
+class _Undefined:
+    pass
+
+class _NoFrame(dict):
+    # stands in for a frame that doesn't exist, every access to it ends with error 55
+    def __missing__(self, key):
+        error_exit(55, "Error: cant access frame, frame doesnt exist")
+
+    def __contains__(self, key):
+        error_exit(55, "Error: cant access frame, frame doesnt exist")
+
+    def __setitem__(self, key, value):
+        error_exit(55, "Error: cant access frame, frame doesnt exist")
+
+
+NIL = _Nil()
+UNDEFINED = _Undefined()
+NOFRAME = _NoFrame()
+TYPE_NAMES = {int: "int", bool: "bool", str: "string", _Nil: "nil", _Undefined: ""}
+
+GF = {}
+TF = NOFRAME
+LF = NOFRAME
+frame_stack = []
+frame_pool = []     # dropped temporary frames, reused by createframe()
+call_stack = []
+data_stack = []
+write = sys.stdout.write
+user_input = sys.stdin
+
+
+def error_exit(err_code, err_msg):
+    sys.stdout.flush()
+    sys.stderr.write(err_msg)
+    sys.exit(err_code)
+
+def operand_error(*values):
+    for value in values:
+        if value is UNDEFINED:
+            error_exit(56, "Error: Accessing uninitialised variable.")
+    error_exit(53, "Error: incorrect symbol types.")
+
+def uninitialised():
+    error_exit(56, "Error: Accessing uninitialised variable.")
+
+def undefined_variable():
+    error_exit(54, "Accessing non-existing variable.")
+
+def undefined_label():
+    error_exit(52, "Error: jumping to unknown label.")
+
+def redefinition():
+    error_exit(52, "Error: variable redefinition.")
+
+def to_text(value):
+    if value.__class__ is str:
+        return value
+    if value.__class__ is bool:
+        return "true" if value else "false"
+    if value is NIL:
+        return ""
+    if value is UNDEFINED:
+        uninitialised()
+    return str(value)
+
+_escape = re.compile(r"\\(\d{3})")
+def decode_escape_sequences(text):
+    return _escape.sub(lambda match: chr(int(match.group(1))), text)
+
+def read_value(type_name):
+    line = user_input.readline()
+    if line == "":
+        return NIL
+    line = line.rstrip("\n")
+    if type_name == "bool":
+        return line.lower() == "true"
+    if type_name == "int":
+        try:
+            return int(line)
+        except ValueError:
+            return NIL
+    return decode_escape_sequences(line)
+
+def int2char(value):
+    try:
+        return chr(value)
+    except (ValueError, OverflowError):
+        error_exit(58, "Error: Incorrect INT2CHAR number value.")
+
+def index_error():
+    error_exit(58, "Error: indexing error.")
+
+def exit_program(value):
+    if value.__class__ is not int:
+        operand_error(value)
+    if not 0 <= value <= 49:
+        error_exit(57, "Error: incorrect exitcode value.")
+    sys.exit(value)
+
+def pops():
+    if not data_stack:
+        error_exit(56, "Error: can't pop, stack is empty.")
+    return data_stack.pop()
+
+def createframe():
+    # a replaced frame is referenced nowhere else, so it's cleared and reused
+    global TF
+    if TF is not NOFRAME:
+        TF.clear()
+    elif frame_pool:
+        TF = frame_pool.pop()
+    else:
+        TF = {}
+
+def pushframe():
+    global TF, LF
+    if TF is NOFRAME:
+        error_exit(55, "Error: undefined Temporary Frame.")
+    frame_stack.append(TF)
+    LF = TF
+    TF = NOFRAME
+
+def popframe():
+    global TF, LF
+    if not frame_stack:
+        error_exit(55, "Error: Frame Stack is empty, nothing to pop.")
+    if TF is not NOFRAME:
+        TF.clear()
+        frame_pool.append(TF)
+    TF = frame_stack.pop()
+    LF = frame_stack[-1] if frame_stack else NOFRAME
+
+def ret():
+    if not call_stack:
+        error_exit(56, "Error: call stack empty.")
+    return call_stack.pop()
+
+'''
+
+MAIN = r'''
+
+def main():
+    global user_input
+    parser = ArgumentParser()
+    parser.add_argument('--input', metavar='<input file>')
+    args = parser.parse_args()
+    if args.input is not None:
+        try:
+            user_input = open(args.input, "r")
+        except FileNotFoundError:
+            error_exit(11, "Input file not found.")
+
+    block = {entry}
+    try:
+        while block is not None:
+            block = block()
+    except KeyError:
+        undefined_variable()
+
+
+if __name__ == "__main__":
+    main()
+'''
+
+# instructions after which a new basic block has to start
+BLOCK_ENDS = {"JUMP", "JUMPIFEQ", "JUMPIFNEQ", "JUMPIFEQS", "JUMPIFNEQS", "CALL", "RETURN", "EXIT"}
+
+
+class Transpiler:
+    def __init__(self, program):
+        self.program = program
+        self.instructions = program.program_instructions
+        self.block_starts = []
+        self.block_of_instruction = {}
+        self.lines = []
+
+    def split_blocks(self):
+        leaders = {0}
+        for index, instruction in enumerate(self.instructions):
+            if instruction.name == "LABEL":
+                leaders.add(index)
+            elif instruction.name in BLOCK_ENDS:
+                leaders.add(index + 1)
+        self.block_starts = sorted(leader for leader in leaders if leader < len(self.instructions))
+        for number, start in enumerate(self.block_starts):
+            self.block_of_instruction[start] = number
+
+    def block_name(self, index):
+        if index >= len(self.instructions):
+            return "None"
+        return f"block{self.block_of_instruction[index]}"
+
+    def label_block(self, label):
+        if label.literalValue not in self.program.program_labels:
+            return None
+        return self.block_name(self.program.program_labels[label.literalValue])
+
+    def literal(self, arg):
+        if arg.type_name in ("int", "bool"):
+            return repr(arg.literalValue)
+        if arg.type_name == "nil":
+            return "NIL"
+        if arg.type_name == "string":
+            return repr(arg.literalValue)
+        raise CompileError(53, f"Error: {arg.type_name} can't be used as a symbol.")
+
+    @staticmethod
+    def var(variable):
+        return f"{variable.varframe}[{variable.varname!r}]"
+
+    def symbol(self, arg):
+        if arg.type_name == "var":
+            return self.var(arg.variable)
+        return self.literal(arg)
+
+    def load(self, target, arg, initialised=False):
+        # loads the symbol into a local, initialised=True also checks the variable has a value
+        self.emit(f"{target} = {self.symbol(arg)}")
+        if initialised and arg.type_name == "var":
+            self.emit(f"if {target} is UNDEFINED: uninitialised()")
+
+    def load_operands(self, arg1, arg2, initialised=False):
+        # loads a and b, the first one is checked before the second variable is accessed (which can fail with 54 or 55),
+        # like in the interpreter
+        self.load("a", arg1, initialised or arg2.type_name == "var")
+        self.load("b", arg2, initialised)
+
+    def store(self, variable, expression):
+        # like in the interpreter, the result is computed before the target variable is checked
+        if not expression.isidentifier():
+            self.emit(f"r = {expression}")
+            expression = "r"
+        self.emit(f"if {variable.varname!r} not in {variable.varframe}: undefined_variable()")
+        self.emit(f"{self.var(variable)} = {expression}")
+
+    def emit(self, line):
+        self.lines.append("    " + line)
+
+    def emit_operation(self, name):
+        # emits the operand checks of the operation on the locals a (and b), returns the expression of its result
+        if name in ("ADD", "SUB", "MUL", "IDIV"):
+            self.emit("if a.__class__ is not int or b.__class__ is not int: operand_error(a, b)")
+            if name == "IDIV":
+                self.emit("if b == 0: error_exit(57, 'Error: zero division error.')")
+            return "a " + {"ADD": "+", "SUB": "-", "MUL": "*", "IDIV": "//"}[name] + " b"
+        if name in ("LT", "GT"):
+            self.emit("if a.__class__ is not b.__class__ or a is NIL or a is UNDEFINED: operand_error(a, b)")
+            return "a < b" if name == "LT" else "a > b"
+        if name == "EQ":
+            self.emit("if a.__class__ is not b.__class__ and a is not NIL and b is not NIL: operand_error(a, b)")
+            return "a.__class__ is b.__class__ and a == b"
+        if name in ("AND", "OR"):
+            self.emit("if a.__class__ is not bool or b.__class__ is not bool: operand_error(a, b)")
+            return "a and b" if name == "AND" else "a or b"
+        if name == "NOT":
+            self.emit("if a.__class__ is not bool: operand_error(a)")
+            return "not a"
+        if name == "INT2CHAR":
+            self.emit("if a.__class__ is not int: operand_error(a)")
+            return "int2char(a)"
+        if name == "STRI2INT":
+            self.emit("if a.__class__ is not str or b.__class__ is not int: operand_error(a, b)")
+            self.emit("if not 0 <= b < len(a): index_error()")
+            return "ord(a[b])"
+        raise CompileError(99, f"Error: unknown operation {name}.")
+
+    def emit_jump_condition(self, name, target):
+        condition = self.emit_operation("EQ")
+        if name == "JUMPIFNEQ":
+            condition = f"not ({condition})"
+        self.emit(f"if {condition}: return {target if target else 'undefined_label()'}")
+
+    def compile_instruction(self, instruction, index):
+        name = instruction.name
+        args = instruction.args
+
+        if name in ("LABEL", "BREAK", "DPRINT"):
+            self.emit("pass")
+        elif name == "MOVE":
+            self.load("a", args[1], initialised=True)
+            self.store(args[0].variable, "a")
+        elif name == "CREATEFRAME":
+            self.emit("createframe()")
+        elif name == "PUSHFRAME":
+            self.emit("pushframe()")
+        elif name == "POPFRAME":
+            self.emit("popframe()")
+        elif name == "DEFVAR":
+            variable = args[0].variable
+            self.emit(f"if {variable.varname!r} in {variable.varframe}: redefinition()")
+            self.emit(f"{self.var(variable)} = UNDEFINED")
+        elif name == "CALL":
+            target = self.label_block(args[0])
+            self.emit(f"call_stack.append({self.block_name(index + 1)})")
+            self.emit(f"return {target}" if target else "return undefined_label()")
+        elif name == "RETURN":
+            self.emit("return ret()")
+        elif name == "PUSHS":
+            self.load("a", args[0], initialised=True)
+            self.emit("data_stack.append(a)")
+        elif name == "POPS":
+            # the empty stack is reported before a missing variable
+            self.emit("a = pops()")
+            self.store(args[0].variable, "a")
+        elif name in ("ADD", "SUB", "MUL", "IDIV"):
+            self.emit(f"if {args[0].variable.varname!r} not in {args[0].variable.varframe}: undefined_variable()")
+            self.load_operands(args[1], args[2])
+            self.emit(f"{self.var(args[0].variable)} = {self.emit_operation(name)}")
+        elif name in ("LT", "GT", "EQ", "AND", "OR", "STRI2INT"):
+            self.load_operands(args[1], args[2], initialised=name == "EQ")
+            self.store(args[0].variable, self.emit_operation(name))
+        elif name in ("NOT", "INT2CHAR"):
+            self.load("a", args[1])
+            self.store(args[0].variable, self.emit_operation(name))
+        elif name in ("ADDS", "SUBS", "MULS", "IDIVS", "LTS", "GTS", "EQS", "ANDS", "ORS", "STRI2INTS"):
+            self.emit("b = pops()")
+            self.emit("a = pops()")
+            self.emit(f"data_stack.append({self.emit_operation(name[:-1])})")
+        elif name in ("NOTS", "INT2CHARS"):
+            self.emit("a = pops()")
+            self.emit(f"data_stack.append({self.emit_operation(name[:-1])})")
+        elif name == "CLEARS":
+            self.emit("data_stack.clear()")
+        elif name in ("JUMPIFEQS", "JUMPIFNEQS"):
+            target = self.label_block(args[0])
+            self.emit("b = pops()")
+            self.emit("a = pops()")
+            self.emit_jump_condition(name[:-1], target)
+        elif name == "GETCHAR":
+            # the operands are checked one by one in the order of instruction_getchar()
+            self.load("a", args[1], initialised=True)
+            self.emit("if a.__class__ is not str: operand_error(a)")
+            self.load("b", args[2])
+            self.emit("if b.__class__ is not int: operand_error(b)")
+            self.emit("if not 0 <= b < len(a): index_error()")
+            self.store(args[0].variable, "a[b]")
+        elif name == "SETCHAR":
+            self.emit(f"s = {self.var(args[0].variable)}")
+            self.emit("if s.__class__ is not str: operand_error(s)")
+            self.load("a", args[1])
+            self.emit("if a.__class__ is not int: operand_error(a)")
+            self.load("b", args[2])
+            self.emit("if b.__class__ is not str: operand_error(b)")
+            self.emit("if not 0 <= a < len(s) or b == '': index_error()")
+            self.emit(f"{self.var(args[0].variable)} = s[:a] + b[0] + s[a + 1:]")
+        elif name == "READ":
+            if args[1].type_name != "type":
+                raise CompileError(53, "Error: wrong operand type.")
+            self.store(args[0].variable, f"read_value({args[1].literalValue!r})")
+        elif name == "WRITE":
+            self.load("a", args[0])
+            self.emit("write(a if a.__class__ is str else to_text(a))")
+        elif name == "CONCAT":
+            self.load_operands(args[1], args[2])
+            self.emit("if a.__class__ is not str or b.__class__ is not str: operand_error(a, b)")
+            self.store(args[0].variable, "a + b")
+        elif name == "STRLEN":
+            self.load("a", args[1])
+            self.emit("if a.__class__ is not str: operand_error(a)")
+            self.store(args[0].variable, "len(a)")
+        elif name == "TYPE":
+            self.load("a", args[1])
+            self.store(args[0].variable, "TYPE_NAMES[a.__class__]")
+        elif name in ("JUMPIFEQ", "JUMPIFNEQ"):
+            target = self.label_block(args[0])
+            self.load_operands(args[1], args[2], initialised=True)
+            self.emit_jump_condition(name, target)
+        elif name == "JUMP":
+            target = self.label_block(args[0])
+            self.emit(f"return {target}" if target else "return undefined_label()")
+        elif name == "EXIT":
+            self.load("a", args[0])
+            self.emit("exit_program(a)")
+        else:
+            raise CompileError(32, "Error: Unknown instruction opcode.")
+
+    def compile(self):
+        self.split_blocks()
+        for number, start in enumerate(self.block_starts):
+            end = self.block_starts[number + 1] if number + 1 < len(self.block_starts) else len(self.instructions)
+            self.lines.append(f"def block{number}():")
+            for index in range(start, end):
+                instruction = self.instructions[index]
+                self.emit(f"# {index}: {instruction.name}")
+                self.compile_instruction(instruction, index)
+            if self.instructions[end - 1].name not in ("JUMP", "CALL", "RETURN"):
+                self.emit(f"return {self.block_name(end)}")
+            self.lines.append("")
+
+        entry = "block0" if self.instructions else "None"
+        return RUNTIME + "\n".join(self.lines) + MAIN.replace("{entry}", entry)
+
+
+def compile_program(program, output_file):
+    source = Transpiler(program).compile()
+    with open(output_file, "w") as file:
+        file.write(source)